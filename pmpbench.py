@@ -0,0 +1,386 @@
+"""
+Benchmarks for the question bank in pmpexamapp2.py.py.
+
+Run from the repository root:
+    python pmpbench.py                       # comparison tables
+    python pmpbench.py suite --out run.json  # reproducible suite, JSON results
+    python pmpbench.py suite --baseline baseline.json  # flag regressions
+"""
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def load_bank_module():
+    # The bank lives in a file whose name is not a valid module name.
+    path = Path(__file__).with_name("pmpexamapp2.py.py")
+    spec = importlib.util.spec_from_file_location("pmpexamapp2", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+pmp = load_bank_module()
+
+
+def best_of(fn, repeat: int = 5):
+    """
+    Returns the best wall time of `repeat` calls to fn, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_filters(seed: int = 7):
+    """
+    Filter pushdown vs. the old start_quiz path (generate 200, then filter).
+    """
+    cases = [
+        ("all domains", None, None, 50),
+        ("People only", ["People"], None, 50),
+        ("Business only", ["Business Environment"], None, 50),
+        ("People + Business", ["People", "Business Environment"], None, 100),
+        ("one topic", None, ["Risk vs Issue"], 50),
+    ]
+    print(f"{'filter':<20} {'n':>4} {'gen+filter':>12} {'reached':>8} {'pushdown':>12} {'reached':>8}")
+    for label, domains, topics, n in cases:
+
+        def generate_then_filter():
+            bank = pmp.generate_question_bank(total=200, seed=seed)
+            return [
+                q for q in bank
+                if (domains is None or q["domain"] in domains) and (topics is None or q["topic"] in topics)
+            ][:n]
+
+        def pushdown():
+            return pmp.generate_question_bank(total=n, seed=seed, domains=domains, topics=topics)
+
+        old_t, new_t = best_of(generate_then_filter), best_of(pushdown)
+        old_n, new_n = len(generate_then_filter()), len(pushdown())
+        print(f"{label:<20} {n:>4} {old_t * 1e3:>10.2f}ms {old_n:>8} {new_t * 1e3:>10.2f}ms {new_n:>8}")
+
+
+def bench_throughput(total: int = 100_000, seed: int = 7):
+    """
+    Generation throughput in questions per second.
+    """
+    bank = tuple(pmp.iter_compact_bank(total=total, seed=seed))
+    cases = [
+        ("records (iter_compact_bank)", lambda: sum(1 for _ in pmp.iter_compact_bank(total=total, seed=seed))),
+        ("render question text", lambda: [q.question for q in bank]),
+        ("dicts (generate_question_bank)", lambda: pmp.generate_question_bank(total=total, seed=seed)),
+    ]
+    print(f"{'stage':<32} {'questions/s':>12}")
+    for label, fn in cases:
+        print(f"{label:<32} {total / best_of(fn, repeat=3):>12,.0f}")
+
+
+def bench_backends(sizes=(10_000, 100_000, 1_000_000), seed: int = 7):
+    """
+    Python vs. NumPy backend of generate_compact_bank, in questions per second.
+    """
+    backends = ["python"] + (["numpy"] if pmp.np is not None else [])
+    print(f"{'total':>10} " + " ".join(f"{b:>14}" for b in backends))
+    for total in sizes:
+        rates = [total / best_of(lambda: pmp.generate_compact_bank(total=total, seed=seed, backend=b), repeat=3) for b in backends]
+        print(f"{total:>10,} " + " ".join(f"{r:>14,.0f}" for r in rates))
+
+
+def bench_sharding(total: int = 1_000_000, seed: int = 7, backend: str = "python"):
+    """
+    Sharded generation with 1..N worker processes (N = CPU count, at least 4).
+    """
+    print(f"sharded {backend} backend, {total:,} questions, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>9} {'questions/s':>14} {'speedup':>8}")
+    base = None
+    for workers in range(1, max(4, os.cpu_count() or 1) + 1):
+        t = best_of(lambda: pmp.generate_compact_bank(total=total, seed=seed, backend=backend, workers=workers), repeat=1)
+        base = base or t
+        print(f"{workers:>8} {t:>9.2f} {total / t:>14,.0f} {base / t:>7.2f}x")
+
+
+def bench_grading(total: int = 200_000, submissions: int = 100_000, seed: int = 7):
+    """
+    grade_batch throughput per bank type, in answers per second.
+    """
+    import random
+
+    rng = random.Random(seed)
+    ids = [rng.randrange(total) for _ in range(submissions)]
+    selections = [rng.choice([pmp.UNANSWERED, pmp.SKIPPED, 0, 1, 2, 3]) for _ in ids]
+    banks = [
+        ("CompactBank", pmp.generate_compact_bank(total=total, seed=seed)),
+        ("tuple of Question", tuple(pmp.iter_compact_bank(total=total, seed=seed))),
+    ]
+    print(f"{'bank':<20} {'answers/s':>14}")
+    for label, bank in banks:
+        print(f"{label:<20} {submissions / best_of(lambda: pmp.grade_batch(bank, ids, selections), repeat=3):>14,.0f}")
+
+
+# -----------------------------
+# Reproducible suite
+# -----------------------------
+SUITE_SIZES = (200, 10_000, 100_000, 1_000_000)
+SUITE_SEEDS = (7, 42, 2024)
+SUITE_FILTERS = {
+    "all": (None, None),
+    "People": (["People"], None),
+    "Business Environment": (["Business Environment"], None),
+    "Process + People": (["Process", "People"], None),
+    "Risk vs Issue": (None, ["Risk vs Issue"]),
+}
+# dict banks hold every rendered question; larger sizes only measure swap
+DICT_BANK_LIMIT = 100_000
+
+
+def measure(fn, repeat: int = 3):
+    """
+    Returns (best wall time in seconds, tracemalloc peak in bytes) for fn.
+    Memory is traced in one extra call so tracing does not skew the timings.
+    """
+    seconds = best_of(fn, repeat)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def _result(case: str, seconds: float, peak: int, **params):
+    return {"case": case, "params": params, "seconds": seconds, "peak_bytes": peak}
+
+
+def suite_generation(sizes=SUITE_SIZES, seeds=SUITE_SEEDS):
+    """
+    Bank generation per size and seed: compact banks on each backend and, up to
+    DICT_BANK_LIMIT, the list of dicts that generate_question_bank returns.
+    """
+    backends = ["python"] + (["numpy"] if pmp.np is not None else [])
+    for total in sizes:
+        for seed in seeds:
+            for backend in backends:
+                yield _result(
+                    "generate_compact_bank",
+                    *measure(lambda: pmp.generate_compact_bank(total=total, seed=seed, backend=backend), repeat=1 if total >= 1_000_000 else 3),
+                    total=total, seed=seed, backend=backend,
+                )
+            if total <= DICT_BANK_LIMIT:
+                yield _result(
+                    "generate_question_bank",
+                    *measure(lambda: pmp.generate_question_bank(total=total, seed=seed)),
+                    total=total, seed=seed,
+                )
+
+
+def suite_filters(sizes=(200, 10_000), seed: int = 7):
+    """
+    Filtered generation and start_quiz-style sampling from a full bank.
+    """
+    bank = pmp.generate_compact_bank(total=max(sizes), seed=seed)
+    strata = pmp.BankStrata(bank)
+    for label, (domains, topics) in SUITE_FILTERS.items():
+        for total in sizes:
+            yield _result(
+                "generate_question_bank",
+                *measure(lambda: pmp.generate_question_bank(total=total, seed=seed, domains=domains, topics=topics)),
+                total=total, seed=seed, filter=label,
+            )
+        yield _result(
+            "sample_bank",
+            *measure(lambda: pmp.sample_bank(bank, 200, seed=seed, domains=domains, topics=topics)),
+            total=len(bank), n=200, seed=seed, filter=label,
+        )
+        yield _result(
+            "BankStrata.sample",
+            *measure(lambda: strata.sample(200, seed=seed, domains=domains, topics=topics)),
+            total=len(bank), n=200, seed=seed, filter=label,
+        )
+
+
+def suite_grading(sizes=(10_000, 100_000), seed: int = 7):
+    """
+    grade_batch over one random submission per bank question.
+    """
+    import random
+
+    for total in sizes:
+        bank = pmp.generate_compact_bank(total=total, seed=seed)
+        rng = random.Random(seed)
+        ids = [rng.randrange(total) for _ in range(total)]
+        selections = [rng.choice([pmp.UNANSWERED, pmp.SKIPPED, 0, 1, 2, 3]) for _ in ids]
+        yield _result("grade_batch", *measure(lambda: pmp.grade_batch(bank, ids, selections)), total=total, seed=seed)
+
+
+def suite_rendering(sizes=(200, 10_000), seed: int = 7):
+    """
+    Rendering every field of compact Question records into plain dicts.
+    """
+    for total in sizes:
+        bank = pmp.generate_compact_bank(total=total, seed=seed)
+        yield _result("render", *measure(lambda: [dict(q) for q in bank]), total=total, seed=seed)
+
+
+def suite_app(rounds: int = 10, seed: int = 7):
+    """
+    End-to-end app reruns driven headlessly through Streamlit's AppTest.
+    Each interaction keeps the median rerun time over `rounds` and the
+    highest tracemalloc peak of any single rerun.
+    """
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return
+
+    def button(at, label):
+        return next(b for b in at.button if label in b.label)
+
+    # Synthetic answers must not land in the learners' attempt history.
+    os.environ["PMP_ATTEMPTS_DB"] = ""
+    at = AppTest.from_file(str(Path(__file__).with_name("pmpexamapp.py.py")), default_timeout=60)
+    timings = {"initial": [], "start": [], "select": [], "confirm": [], "next": []}
+    peaks = dict.fromkeys(timings, 0)
+
+    def rerun(name):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        at.run()
+        timings[name].append(time.perf_counter() - start)
+        peaks[name] = max(peaks[name], tracemalloc.get_traced_memory()[1])
+        if at.exception:
+            raise RuntimeError(f"app raised during {name!r}: {at.exception[0].message}")
+
+    tracemalloc.start()
+    try:
+        rerun("initial")
+        at.number_input[0].set_value(seed)
+        at.slider[0].set_value(max(10, rounds))
+        for name, step in [
+            ("start", lambda: button(at, "Start").click()),
+            *[
+                (name, step)
+                for _ in range(rounds)
+                for name, step in [
+                    ("select", lambda: at.radio[0].set_value(1)),
+                    ("confirm", lambda: button(at, "Confirm").click()),
+                    ("next", lambda: button(at, "Next").click()),
+                ]
+            ],
+        ]:
+            step()
+            rerun(name)
+    finally:
+        tracemalloc.stop()
+    for name, runs in timings.items():
+        yield _result("app_rerun", statistics.median(runs), peaks[name], interaction=name, seed=seed, rounds=len(runs))
+
+
+def run_suite(quick: bool = False, app: bool = True):
+    """
+    Runs every suite and returns a JSON-serialisable results document.
+    quick caps bank sizes at 10,000 for a fast smoke run.
+    """
+    sizes = tuple(s for s in SUITE_SIZES if not quick or s <= 10_000)
+    suites = [
+        suite_generation(sizes),
+        suite_filters(),
+        suite_grading(sizes=tuple(s for s in (10_000, 100_000) if s <= max(sizes))),
+        suite_rendering(),
+    ]
+    if app:
+        suites.append(suite_app())
+    results = []
+    for suite in suites:
+        for result in suite:
+            print(f"{result['case']:<24} {_params_label(result['params']):<52} "
+                  f"{result['seconds'] * 1e3:>11.2f}ms {result['peak_bytes'] / 2**20:>9.1f}MiB")
+            results.append(result)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "generator_version": pmp.GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": getattr(pmp.np, "__version__", None),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def _params_label(params):
+    return " ".join(f"{k}={v}" for k, v in params.items())
+
+
+def _result_key(result):
+    return result["case"], _params_label(dict(sorted(result["params"].items())))
+
+
+def compare(current, baseline, threshold: float = 0.20, min_seconds: float = 0.001):
+    """
+    Compares two results documents case by case and returns the regressions:
+    (case, params, metric, baseline value, current value) for every time or
+    peak memory that grew by more than `threshold`. Timings below min_seconds
+    in both runs are too noisy to judge and are skipped.
+    """
+    old = {_result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = _result_key(result)
+        if key not in old:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            before, after = old[key][metric], result[metric]
+            if metric == "seconds" and max(before, after) < min_seconds:
+                continue
+            if before and after > before * (1 + threshold):
+                regressions.append((*key, metric, before, after))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Question bank benchmarks.")
+    commands = parser.add_subparsers(dest="command")
+    suite = commands.add_parser("suite", help="run the reproducible suite and write JSON results")
+    suite.add_argument("--out", help="write results to this JSON file")
+    suite.add_argument("--baseline", help="compare against a stored results file")
+    suite.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown or memory growth (default 0.20)")
+    suite.add_argument("--quick", action="store_true", help="cap bank sizes at 10,000")
+    suite.add_argument("--no-app", action="store_true", help="skip the AppTest reruns")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        document = run_suite(quick=args.quick, app=not args.no_app)
+        if args.out:
+            Path(args.out).write_text(json.dumps(document, indent=2) + "\n")
+            print(f"wrote {len(document['results'])} results to {args.out}")
+        if args.baseline:
+            regressions = compare(document, json.loads(Path(args.baseline).read_text()), args.threshold)
+            for case, params, metric, before, after in regressions:
+                print(f"REGRESSION {case} {params} {metric}: {before:.4g} -> {after:.4g} (+{after / before - 1:.0%})")
+            print(f"{len(regressions)} regression(s) against {args.baseline}")
+            sys.exit(1 if regressions else 0)
+    else:
+        bench_filters()
+        print()
+        bench_throughput()
+        print()
+        bench_backends()
+        print()
+        bench_sharding()
+        print()
+        bench_grading()
@@ -1,418 +1,299 @@
-import random
+import importlib.util
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
 import streamlit as st
 
-# -----------------------------
-# Question bank (combined)
-# -----------------------------
-DOMAINS = ["Process", "People", "Business Environment"]
-
-
-def _vars(rng: random.Random):
-    names = ["Aisha", "Miguel", "Chen", "Priya", "Omar", "Sofia", "Liam", "Fatima", "Kenji", "Elena", "Ravi", "Noah"]
-    industries = ["healthcare", "fintech", "manufacturing", "telecom", "retail", "energy", "public sector", "education"]
-    approaches = ["predictive", "agile", "hybrid"]
-    phases = ["initiating", "planning", "execution", "monitoring and controlling", "closing", "an iteration", "a sprint review"]
-    sizes = ["a small", "a major", "an urgent", "a late-breaking"]
-    return {
-        "name": rng.choice(names),
-        "industry": rng.choice(industries),
-        "approach": rng.choice(approaches),
-        "phase": rng.choice(phases),
-        "size": rng.choice(sizes),
-    }
-
-
-def generate_question_bank(total: int = 200, seed: int = 7):
-    """
-    Returns a list of dict questions:
-      {id, domain, topic, question, options, answer_index, explanation}
-    Bank is created by mixing PMP-style scenario templates with varied context.
-    """
-    rng = random.Random(seed)
-
-    # Distribution similar to PMP ECO weighting
-    n_process = int(total * 0.50)
-    n_people = int(total * 0.40)
-    n_business = total - n_process - n_people  # remainder ~10%
-
-    questions = []
-    questions += _generate_process(n_process, rng)
-    questions += _generate_people(n_people, rng)
-    questions += _generate_business(n_business, rng)
-
-    rng.shuffle(questions)
-    return questions
-
-
-def _generate_process(n: int, rng: random.Random):
-    templates = []
-
-    templates.append({
-        "topic": "Integration / Change control",
-        "q": "{name} is managing a {approach} project in {industry}. A stakeholder requests {size} change during {phase} and asks to bypass the agreed change process. What should the project manager do FIRST?",
-        "options": [
-            "Approve the change to maintain stakeholder engagement",
-            "Assess impacts and follow the agreed change control/governance approach",
-            "Escalate to the sponsor immediately",
-            "Update the schedule baseline and implement the change",
-        ],
-        "answer": 1,
-        "exp": "PMP expects: assess impact → follow governance/change approach. Escalation is not first unless required by policy or repeated noncompliance."
-    })
-
-    templates.append({
-        "topic": "Scope / Requirements",
-        "q": "Deliverables are being produced, but key stakeholders say they do not meet expectations. What should the project manager do FIRST?",
-        "options": [
-            "Conduct a quality audit to identify nonconformities",
-            "Review and confirm requirements and acceptance criteria with stakeholders",
-            "Add additional testers to the team",
-            "Escalate to the steering committee",
-        ],
-        "answer": 1,
-        "exp": "If stakeholders reject deliverables, first verify requirements and acceptance criteria (definition of done). Audits/resourcing come after confirming what's expected."
-    })
-
-    templates.append({
-        "topic": "Quality",
-        "q": "The team finds the same defect pattern repeatedly even though inspections occur regularly. What should the project manager do NEXT?",
-        "options": [
-            "Increase inspection frequency",
-            "Perform root cause analysis and implement preventive actions",
-            "Ask the customer to accept the defects due to schedule pressure",
-            "Replace the quality inspector",
-        ],
-        "answer": 1,
-        "exp": "Repeated defects indicate a systemic cause. PMP favors prevention over inspection: root cause analysis (5 Whys, fishbone) → preventive actions."
-    })
-
-    templates.append({
-        "topic": "Schedule / Forecasting",
-        "q": "A key milestone is at risk because remaining work was underestimated. What should the project manager do FIRST?",
-        "options": [
-            "Require overtime to recover the schedule",
-            "Re-estimate remaining work and update the schedule forecast",
-            "Rebaseline the schedule immediately",
-            "Remove low performers from the team",
-        ],
-        "answer": 1,
-        "exp": "First get accurate data and update the forecast. Rebaselining is a formal decision after analysis and approvals; overtime is an option after planning."
-    })
-
-    templates.append({
-        "topic": "Risk vs Issue",
-        "q": "A supplier missed two deliveries and work is now blocked. What should the project manager do NEXT?",
-        "options": [
-            "Log it as a risk and monitor",
-            "Record it as an issue and implement the issue response/escalation path",
-            "Ignore it until the next status meeting",
-            "Only update the lessons learned register",
-        ],
-        "answer": 1,
-        "exp": "A current blocking problem is an issue (not a risk). Capture it in the issue log and execute the agreed issue management/escalation process."
-    })
-
-    templates.append({
-        "topic": "Communications Planning",
-        "q": "Stakeholders complain that updates are inconsistent and they do not know what decisions were made. What should the project manager do FIRST?",
-        "options": [
-            "Send daily status reports to all stakeholders",
-            "Review communication requirements and update the communications management plan",
-            "Escalate to the sponsor",
-            "Replace the communications tool",
-        ],
-        "answer": 1,
-        "exp": "Plan communications based on stakeholder needs: what info, when, how, by whom. 'More reports' is a trap if requirements are unclear."
-    })
-
-    templates.append({
-        "topic": "Procurement",
-        "q": "A vendor proposes a substitute that meets technical specs but changes contract terms. What should the project manager do NEXT?",
-        "options": [
-            "Accept the substitute to avoid delays",
-            "Review the contract and follow the procurement/change control process",
-            "Ask the team to decide and proceed immediately",
-            "Pay extra to keep the schedule",
-        ],
-        "answer": 1,
-        "exp": "Contract changes must follow contractual and integrated change control. Review terms, approvals, and impacts before accepting substitutions."
-    })
-
-    templates.append({
-        "topic": "Agile/Hybrid Value Delivery",
-        "q": "In a(n) {approach} project, during {phase} a stakeholder says a delivered feature does not provide expected value. What should the project manager do NEXT?",
-        "options": [
-            "Submit a formal change request",
-            "Facilitate backlog refinement and ask the product owner to reprioritize",
-            "Reject the feedback because the iteration is complete",
-            "Update the scope baseline",
-        ],
-        "answer": 1,
-        "exp": "Agile/hybrid exams prefer adapting through backlog refinement and reprioritization to maximize value. Formal change requests apply if governance requires it."
-    })
-
-    templates.append({
-        "topic": "Cost / Variance",
-        "q": "Performance reports show cost variance is worsening. What should the project manager do FIRST?",
-        "options": [
-            "Reduce quality activities to save money",
-            "Analyze variance causes and develop corrective actions",
-            "Replace the cost engineer",
-            "Stop reporting cost performance to avoid escalation",
-        ],
-        "answer": 1,
-        "exp": "First analyze causes of variance and plan corrective actions. Cutting quality is a classic PMP trap; personnel changes are rarely the first response."
-    })
-
-    templates.append({
-        "topic": "Governance / Compliance",
-        "q": "Midway through the project, the organization introduces a new governance/compliance requirement. What should the project manager do FIRST?",
-        "options": [
-            "Stop the project immediately",
-            "Assess impacts and determine required updates to plans and baselines",
-            "Ignore until project closing",
-            "Ask the team to work around it informally",
-        ],
-        "answer": 1,
-        "exp": "New governance/compliance constraints require impact assessment first, then updates through the agreed governance/change process."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        v = _vars(rng)
-        out.append({
-            "id": f"P{i+1:03d}",
-            "domain": "Process",
-            "topic": t["topic"],
-            "question": t["q"].format(**v),
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
-
-
-def _generate_people(n: int, rng: random.Random):
-    templates = []
-
-    templates.append({
-        "topic": "Conflict Management",
-        "q": "Two team members strongly disagree on a technical approach and the conflict is hurting team morale. What should the project manager do FIRST?",
-        "options": [
-            "Use authority to pick the solution",
-            "Facilitate a collaborative discussion to understand interests and reach agreement",
-            "Escalate to functional management",
-            "Remove one team member from the project",
-        ],
-        "answer": 1,
-        "exp": "PMP prefers collaborate/problem-solve first. Forcing or escalation is used only when collaboration fails or time/safety constraints demand it."
-    })
-
-    templates.append({
-        "topic": "Servant Leadership",
-        "q": "A high-performing, self-organizing team says the project manager’s frequent oversight is slowing them down. What should the project manager do?",
-        "options": [
-            "Increase monitoring to ensure standards are met",
-            "Adopt servant leadership: empower the team and provide support as needed",
-            "Replace team members who resist oversight",
-            "Escalate the complaint to HR",
-        ],
-        "answer": 1,
-        "exp": "For mature teams, empower and remove impediments. Over-control reduces ownership and performance—an exam-favorite trap."
-    })
-
-    templates.append({
-        "topic": "Stakeholder Engagement",
-        "q": "A key stakeholder actively resists the project because they fear the change will reduce their influence. What should the project manager do FIRST?",
-        "options": [
-            "Escalate to the sponsor to overrule the stakeholder",
-            "Understand concerns and work with the stakeholder on engagement and change readiness",
-            "Ignore the stakeholder and proceed as planned",
-            "Remove the stakeholder from communications and decisions",
-        ],
-        "answer": 1,
-        "exp": "Resistance is addressed through engagement: understand concerns, communicate value, involve stakeholders. Escalate only after collaboration attempts."
-    })
-
-    templates.append({
-        "topic": "Team Development",
-        "q": "New team members joined and roles/responsibilities are unclear. What should the project manager do NEXT?",
-        "options": [
-            "Assign tasks ad hoc and adjust later",
-            "Develop/revisit the team charter and clarify roles (e.g., RACI, working agreements)",
-            "Wait for the team to self-organize over time",
-            "Escalate to the sponsor for direction",
-        ],
-        "answer": 1,
-        "exp": "Clarify roles and working agreements early. Team charters and RACI-style clarity are common PMP correct answers."
-    })
-
-    templates.append({
-        "topic": "Communication & Culture",
-        "q": "A distributed team reports misunderstandings due to cultural and language differences. What should the project manager do NEXT?",
-        "options": [
-            "Use only written communication to avoid confusion",
-            "Tailor communications and establish shared norms, using interactive methods for complex topics",
-            "Replace remote members with local staff",
-            "Stop meetings to reduce conflict",
-        ],
-        "answer": 1,
-        "exp": "Tailor communication, use cultural awareness, and use interactive methods for complex/sensitive topics. Replacing people is rarely first."
-    })
-
-    templates.append({
-        "topic": "Coaching & Performance",
-        "q": "A team member is underperforming because expectations were not clearly communicated. What should the project manager do FIRST?",
-        "options": [
-            "Document the issue and escalate to HR",
-            "Clarify expectations, provide feedback, and coach the team member",
-            "Remove the team member from the project immediately",
-            "Ignore it to avoid conflict",
-        ],
-        "answer": 1,
-        "exp": "PMP prefers direct coaching and clear expectations first. Escalation/removal is later if performance does not improve."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        out.append({
-            "id": f"PE{i+1:03d}",
-            "domain": "People",
-            "topic": t["topic"],
-            "question": t["q"],
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
-
-
-def _generate_business(n: int, rng: random.Random):
-    templates = []
-
-    templates.append({
-        "topic": "Compliance / Regulatory",
-        "q": "Mid-project, a new regulatory requirement is announced that may affect the product design. What should the project manager do FIRST?",
-        "options": [
-            "Ignore it until the next phase to avoid delays",
-            "Assess the impact and determine required changes to remain compliant",
-            "Ask the team to implement changes immediately without analysis",
-            "Close the project early",
-        ],
-        "answer": 1,
-        "exp": "Compliance is non-negotiable. First assess impacts, then follow governance/change control to implement required changes."
-    })
-
-    templates.append({
-        "topic": "Business Value / Benefits",
-        "q": "Deliverables are being completed on schedule, but expected business benefits are not being realized. What should the project manager do NEXT?",
-        "options": [
-            "Continue focusing only on completing deliverables",
-            "Review the benefits management plan and engage stakeholders to realign to outcomes",
-            "Increase reporting frequency",
-            "Reduce scope to finish earlier",
-        ],
-        "answer": 1,
-        "exp": "PMP emphasizes value delivery: verify benefits realization and realign via governance. Outputs ≠ outcomes is a core exam theme."
-    })
-
-    templates.append({
-        "topic": "Strategy Alignment",
-        "q": "A project supports a strategic objective, but market conditions changed and the objective may no longer be valid. What should the project manager do FIRST?",
-        "options": [
-            "Hide the information to prevent cancellation",
-            "Raise the concern through governance and request a business case/strategy review",
-            "Push the team to deliver faster to prove value",
-            "Reduce quality to meet deadlines",
-        ],
-        "answer": 1,
-        "exp": "When strategy shifts, the PM should surface it through governance so leadership can decide to continue, pivot, pause, or terminate."
-    })
-
-    templates.append({
-        "topic": "Governance / Policy",
-        "q": "The sponsor requests a feature that conflicts with an organizational policy. What should the project manager do?",
-        "options": [
-            "Implement the feature because the sponsor requested it",
-            "Explain the constraint, assess options, and follow governance for a compliant decision",
-            "Ask the team to implement it quietly",
-            "Remove the policy from project documentation",
-        ],
-        "answer": 1,
-        "exp": "Policy/compliance constraints must be respected. Communicate constraints, assess alternatives, and use governance for approvals."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        out.append({
-            "id": f"B{i+1:03d}",
-            "domain": "Business Environment",
-            "topic": t["topic"],
-            "question": t["q"],
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
+
+@st.cache_resource(show_spinner=False)
+def bank_module():
+    # The question bank lives in pmpexamapp2.py.py, whose name is not a valid
+    # module name. Loaded once per server process, so its classes, caches and
+    # METRICS registry are the same objects on every rerun.
+    module = sys.modules.get("pmpexamapp2")
+    if module is None:
+        path = Path(__file__).with_name("pmpexamapp2.py.py")
+        spec = importlib.util.spec_from_file_location("pmpexamapp2", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module  # process pools pickle its functions by module name
+        spec.loader.exec_module(module)
+    return module
+
+
+pmp = bank_module()
+DOMAINS, TOPIC_INDEX, METRICS = pmp.DOMAINS, pmp.TOPIC_INDEX, pmp.METRICS
 
 
 # -----------------------------
-# Streamlit app (combined)
+# Streamlit app
 # -----------------------------
 st.set_page_config(page_title="PMP Exam Simulator", page_icon="🧠", layout="centered")
 st.title("🧠 PMP Exam Simulator (200-question bank)")
 st.caption("PMP-style scenario questions across Process, People, and Business Environment. Confirm answers to see explanations.")
 
 
+@st.cache_resource
+def bank_cache():
+    # One cache per server process, shared by every session's script thread.
+    return pmp.BankCache(maxsize=32, max_bytes=256 << 20)
+
+
+@st.cache_resource
+def bank_file():
+    # Optional pre-built pool (python pmpexamapp2.py.py export PATH), mapped
+    # once per process; replicas on the same host share its page cache.
+    # A .jsonl or .csv file is imported instead, through the content-hash
+    # cache in PMP_IMPORT_CACHE (default ~/.cache/pmpexam).
+    path = os.environ.get("PMP_BANK_FILE")
+    if not path:
+        return None
+    if path.lower().endswith((".jsonl", ".csv")):
+        return pmp.import_bank(path, cache_dir=os.environ.get("PMP_IMPORT_CACHE") or None)
+    return pmp.load_bank(path)
+
+
+def quiz_pool(unique: bool = False):
+    # The pool file serves every quiz except unique ones from an exported
+    # pool, which may repeat questions; imported questions are used as is.
+    pool = bank_file()
+    if pool is None or (unique and not isinstance(pool, pmp.ImportedBank)):
+        return None
+    return pool
+
+
+@st.cache_resource
+def pool_strata():
+    # Pool positions by domain and topic, indexed once so each quiz samples in O(questions).
+    return pmp.BankStrata(bank_file())
+
+
+@st.cache_resource
+def pool_topics():
+    # {domain: topics} of an imported pool, whose topics need not be in TOPIC_INDEX
+    topics = {domain: {} for domain in DOMAINS}
+    for t in bank_file().templates:
+        topics[t.domain][t.topic] = None
+    return {domain: list(names) for domain, names in topics.items()}
+
+
+@st.cache_resource(show_spinner="Indexing questions…")
+def search_index():
+    # Built on the first search and shared by every session: the pool file
+    # when there is one, else every distinct question the generator makes.
+    # Domain and topic filters apply at search time, so quiz settings never
+    # rebuild it.
+    pool = bank_file()
+    return pmp.SearchIndex(pool if pool is not None else pmp.distinct_bank())
+
+
+@st.cache_resource
+def metrics():
+    # Configures the bank module's registry once per server process.
+    # Opt-in instrumentation:
+    #   PMP_METRICS=1          time the hot paths and count events
+    #   PMP_METRICS_SLOW=0.5   spans at least this slow (s) go to stderr as JSON lines
+    #   PMP_METRICS_PORT=9108  serve 127.0.0.1:PORT/metrics (Prometheus) and /metrics.json
+    #   PMP_METRICS_FILE=PATH  rewrite PATH with Prometheus text every 15 s
+    registry = METRICS
+    if os.environ.get("PMP_METRICS") != "1":
+        return registry
+    registry.enabled = True
+    registry.slow_seconds = float(os.environ.get("PMP_METRICS_SLOW", "0.5"))
+    log = logging.getLogger("pmpexam.metrics")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.WARNING)
+    log.propagate = False
+    if os.environ.get("PMP_METRICS_PORT"):
+        registry.serve(int(os.environ["PMP_METRICS_PORT"]))
+    if os.environ.get("PMP_METRICS_FILE"):
+        registry.export_file(os.environ["PMP_METRICS_FILE"])
+    return registry
+
+
+metrics()
+
+
+@st.cache_resource
+def attempt_store():
+    # One writer thread per server process, shared by every session.
+    # PMP_ATTEMPTS_DB="" turns attempt logging off.
+    path = os.environ.get("PMP_ATTEMPTS_DB", "pmp_attempts.db")
+    return pmp.AttemptStore(path) if path else None
+
+
+def log_attempt(q, selected: int, correct: bool, skipped: bool = False):
+    # Queued for the background writer: never waits for the disk.
+    store = attempt_store()
+    if store is not None:
+        store.record(
+            st.session_state.user_id,
+            st.session_state.seed,
+            q,
+            selected,
+            correct,
+            skipped=skipped,
+            seconds=time.time() - st.session_state.shown_at[1],
+            mode=st.session_state.mode,
+        )
+
+
+DEFAULT_QUESTIONS = 50
+
+
+@st.cache_resource
+def warm_up():
+    # Once per server process: prebuild the default quiz for the default seed
+    # and the seeds learners use most, so the first Starts after boot are hits.
+    # A pool file is indexed by domain and topic in this first run too.
+    if bank_file() is not None:
+        pool_strata()
+    store = attempt_store()
+    seeds = dict.fromkeys([7] + (store.popular_seeds(4) if store is not None else []))
+    return [bank_cache().prefetch(total=DEFAULT_QUESTIONS, seed=seed, domains=DOMAINS) for seed in seeds]
+
+
+def mark_shown(key):
+    # Starts the answer timer the first time question `key` is on screen.
+    if st.session_state.shown_at[0] != key:
+        st.session_state.shown_at = (key, time.time())
+
+
+@METRICS.timed("init_session")
 def init_session():
     if "quiz_started" not in st.session_state:
         st.session_state.quiz_started = False
-    if "questions" not in st.session_state:
-        st.session_state.questions = []
+    if "quiz" not in st.session_state:
+        st.session_state.quiz = None  # QuizState: bank reference, question indices, answer bitsets
     if "idx" not in st.session_state:
         st.session_state.idx = 0
-    if "score" not in st.session_state:
-        st.session_state.score = 0
-    if "answered" not in st.session_state:
-        st.session_state.answered = {}  # qid -> {"selected": int, "correct": bool}
     if "seed" not in st.session_state:
         st.session_state.seed = 7
-
-
-def start_quiz(num_questions: int, selected_domains: list[str], seed: int):
-    bank = generate_question_bank(total=200, seed=seed)
-    filtered = [q for q in bank if q["domain"] in selected_domains]
-
-    if not filtered:
-        st.error("No questions available for the selected domain filters.")
+    if "mode" not in st.session_state:
+        st.session_state.mode = "quiz"  # or "review"
+    if "review" not in st.session_state:
+        st.session_state.review = None  # ReviewScheduler in review mode
+    if "review_last" not in st.session_state:
+        st.session_state.review_last = None  # (item, selected, correct) while its feedback shows
+    if "anon_id" not in st.session_state:
+        st.session_state.anon_id = os.urandom(8).hex()  # per browser session
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = st.session_state.anon_id  # learner name once given
+    if "shown_at" not in st.session_state:
+        st.session_state.shown_at = (None, 0.0)  # (question key, time first shown)
+
+
+@METRICS.timed("start_quiz")
+def start_quiz(
+    num_questions: int,
+    selected_domains: list[str],
+    seed: int,
+    selected_topics: list[str] | None = None,
+    unique: bool = False,
+    review: bool = False,
+):
+    pool = quiz_pool(unique)
+    if pool is not None:
+        # Exact ECO domain shares and per-topic quotas, drawn without
+        # scanning the pool.
+        bank = pool
+        order = pool_strata().sample(num_questions, seed=seed, domains=selected_domains, topics=selected_topics or None)
+    else:
+        # Filters are pushed into generation: unselected domains are never
+        # built, and the quiz always gets num_questions matching questions.
+        try:
+            bank = bank_cache().get(
+                total=num_questions, seed=seed, domains=selected_domains, topics=selected_topics or None, unique=unique
+            )
+        except ValueError as exc:
+            st.error(str(exc))
+            return
+        order = range(len(bank))
+
+    if not order:
+        st.error("No questions available for the selected domain and topic filters.")
         return
 
-    rng = random.Random(seed)
-    rng.shuffle(filtered)
-
-    st.session_state.questions = filtered[: min(num_questions, len(filtered))]
+    # The session keeps a reference to the shared bank plus compact indices.
+    if review:
+        st.session_state.review = pmp.ReviewScheduler(bank, order, seed=seed)
+        st.session_state.review_last = None
+        st.session_state.mode = "review"
+    else:
+        st.session_state.quiz = pmp.QuizState(bank, order)
+        st.session_state.mode = "quiz"
     st.session_state.idx = 0
-    st.session_state.score = 0
-    st.session_state.answered = {}
+    st.session_state.shown_at = (None, 0.0)  # keys repeat across quizzes
     st.session_state.quiz_started = True
     st.session_state.seed = seed
+    METRICS.inc("quizzes_started")
+
+
+@METRICS.timed("render_stats")
+def render_stats(quiz: pmp.QuizState):
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Correct", quiz.score)
+    c2.metric("Incorrect", quiz.incorrect_count)
+    c3.metric("Skipped", quiz.skipped_count)
+    c4.metric("Unanswered", len(quiz) - quiz.answered_count)
+    if quiz.by_domain:
+        for col, (domain, tally) in zip(st.columns(len(quiz.by_domain)), quiz.by_domain.items()):
+            col.metric(domain, f"{tally.accuracy:.0%}", help=f"{tally.correct} / {tally.total} correct")
+        with st.expander("Accuracy by topic"):
+            for topic, tally in sorted(quiz.by_topic.items(), key=lambda item: item[1].accuracy):
+                st.write(f"{topic}: {tally.correct} / {tally.total} ({tally.accuracy:.0%})")
 
 
 def reset_quiz():
-    for k in ["quiz_started", "questions", "idx", "score", "answered", "seed"]:
+    for k in ["quiz_started", "quiz", "idx", "seed", "mode", "review", "review_last", "shown_at"]:
         if k in st.session_state:
             del st.session_state[k]
     init_session()
 
 
+@st.fragment
+@METRICS.timed("search_panel")
+def search_panel(domains, topics):
+    # Typing a query reruns only this fragment; the index is first built here.
+    query = st.text_input(
+        "Keywords",
+        placeholder="e.g. sponsor escalat* OR conflict",
+        help="All words must match; OR separates alternatives; a trailing * matches any word starting with it.",
+    )
+    if not query.strip():
+        return
+    index = search_index()
+    result = index.search(query, domains=domains, topics=topics or None, limit=10, distinct=True)
+    st.caption(f"{result.total:,} matching questions" + (", top 10:" if result.total > 10 else ""))
+    for hit in result.hits:
+        # The content key names a question in every bank (and in the attempt
+        # history); bank ids would only mean something inside this one.
+        q = index.bank[hit.position]
+        repeats = f" · {hit.copies:,} copies in the pool" if hit.copies > 1 else ""
+        st.markdown(f"**{q.key}** · {q.topic}{repeats}  \n{q.question}")
+
+
+warm_up()
 init_session()
 
-with st.sidebar:
+with st.sidebar, METRICS.timer("sidebar"):
     st.header("⚙️ Quiz Settings")
 
+    pool = bank_file()
+    imported = isinstance(pool, pmp.ImportedBank)
+    if imported and pool.errors:
+        st.warning(
+            f"Skipped {len(pool.errors):,} invalid rows of the question file (first at line {pool.errors[0].line}: "
+            f"{pool.errors[0].message})."
+        )
+
+    learner = st.text_input("Learner name (keeps your history across sessions)")
+    st.session_state.user_id = learner.strip().lower() or st.session_state.anon_id
+
     seed = st.number_input(
         "Random seed (same seed = same quiz order)",
         min_value=1,
@@ -427,48 +308,154 @@ with st.sidebar:
         default=DOMAINS,
     )
 
+    selected_topics = st.multiselect(
+        "Topics to include (leave empty for all)",
+        options=list(dict.fromkeys(t for d in selected_domains for t in (pool_topics()[d] if imported else TOPIC_INDEX[d]))),
+    )
+
     num_questions = st.slider(
         "Number of questions",
         min_value=10,
         max_value=200,
-        value=50,
+        value=DEFAULT_QUESTIONS,
         step=10,
     )
 
+    unique = st.checkbox("Unique questions only (no repeats)")
+    if unique and selected_domains and not imported:
+        try:
+            st.caption(f"Up to {pmp.max_unique_total(selected_domains, selected_topics or None)} unique questions with these filters.")
+        except ValueError:
+            pass
+
+    review_mode = st.toggle(
+        "Review mode (spaced repetition)",
+        help="Questions you miss, and their topics, come back sooner; ones you know come back later.",
+    )
+
+    # Build the quiz these settings would start in the background, so Start
+    # only swaps it in. A newer prefetch from this session cancels the last one.
+    if quiz_pool(unique) is None:
+        try:
+            bank_cache().prefetch(
+                total=int(num_questions),
+                seed=int(seed),
+                domains=selected_domains,
+                topics=selected_topics or None,
+                unique=unique,
+                tag=st.session_state.anon_id,
+            )
+        except ValueError:
+            pass  # start_quiz reports bad filters or capacity
+
     col_a, col_b = st.columns(2)
     with col_a:
         if st.button("▶️ Start / Restart", use_container_width=True):
-            start_quiz(num_questions=int(num_questions), selected_domains=selected_domains, seed=int(seed))
+            start_quiz(
+                num_questions=int(num_questions),
+                selected_domains=selected_domains,
+                seed=int(seed),
+                selected_topics=selected_topics,
+                unique=unique,
+                review=review_mode,
+            )
     with col_b:
         if st.button("♻️ Reset", use_container_width=True):
             reset_quiz()
 
+    with st.expander("🔎 Search questions"):
+        search_panel(selected_domains, selected_topics)
+
+@st.fragment
+@METRICS.timed("progress_view")
+def progress_view():
+    # Reads the rollups, not the raw attempts; the store caches the summary
+    # until this learner answers again.
+    store = attempt_store()
+    summary = store.learner_summary(st.session_state.user_id) if store is not None else None
+    if not summary or not summary["answered"]:
+        st.caption("No answers recorded yet." if store is not None else "Attempt logging is off (PMP_ATTEMPTS_DB).")
+        return
+
+    c1, c2 = st.columns(2)
+    c1.metric("Answered", f"{summary['answered']:,}")
+    c2.metric("Accuracy", f"{summary['correct'] / summary['answered']:.0%}")
+    for col, (domain, tally) in zip(st.columns(len(summary["by_domain"])), summary["by_domain"].items()):
+        col.metric(domain, f"{tally.accuracy:.0%}", help=f"{tally.correct:,} / {tally.total:,} correct")
+
+    if len(summary["trend"]) > 1:
+        chart = {"day": [time.strftime("%Y-%m-%d", time.gmtime(day * 86400)) for day, _ in summary["trend"]]}
+        for domain in summary["by_domain"]:
+            chart[domain] = [by[domain].accuracy if domain in by else None for _, by in summary["trend"]]
+        st.caption("Daily accuracy by domain")
+        st.line_chart(chart, x="day")
+
+    st.caption("Topics, weakest first")
+    st.dataframe(
+        [
+            {"Topic": topic, "Answered": tally.total, "Accuracy": f"{tally.accuracy:.0%}"}
+            for topic, tally in sorted(summary["by_topic"].items(), key=lambda item: item[1].accuracy)
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
+with st.expander("📈 Your progress across sessions"):
+    progress_view()
+
 if not st.session_state.quiz_started:
     st.info("Set your quiz options in the sidebar, then click **Start / Restart**.")
     st.stop()
 
-questions = st.session_state.questions
-idx = st.session_state.idx
+# Answering and navigating only rerun the fragments below, not the page
+# config, sidebar and other top-level code.
+@st.fragment
+@METRICS.timed("quiz_view")
+def quiz_view():
+    # Previous/Next rerun this fragment, which re-renders the panels inside it.
+    quiz = st.session_state.quiz
+    idx = st.session_state.idx
+
+    if idx >= len(quiz):
+        results_view()
+        return
+
+    question_panel()
+
+    st.divider()
+    nav1, nav2 = st.columns([1, 1])
+
+    # Callbacks move the index before this fragment reruns, so no extra st.rerun().
+    nav1.button("⬅️ Previous", use_container_width=True, disabled=(idx == 0), on_click=move, args=(-1,))
+    nav2.button("➡️ Next", use_container_width=True, on_click=move, args=(1,))
+
 
-if idx >= len(questions):
+def move(step: int):
+    st.session_state.idx += step
+
+
+@st.fragment
+@METRICS.timed("results_view")
+def results_view():
+    quiz = st.session_state.quiz
     st.success("🎉 Quiz complete!")
-    total = len(questions)
-    score = st.session_state.score
-    st.metric("Final Score", f"{score} / {total}")
+    total = len(quiz)
+    # Running aggregates kept by QuizState: no rescan of the quiz per rerun.
+    st.metric("Final Score", f"{quiz.score} / {total}")
+    render_stats(quiz)
 
-    wrong = []
-    for q in questions:
-        qid = q["id"]
-        if qid in st.session_state.answered and not st.session_state.answered[qid]["correct"]:
-            wrong.append(q)
+    wrong = quiz.incorrect()
 
     if wrong:
         st.subheader("🔎 Review Incorrect Answers")
-        for q in wrong:
+        for i in wrong:
+            q = quiz.question(i)
             qid = q["id"]
-            a = st.session_state.answered[qid]["selected"]
+            a = quiz.selected[i]
             correct = q["answer_index"]
-            with st.expander(f"{qid} — {q['domain']} — {q['topic']}"):
+            label = " (skipped)" if quiz.is_skipped(i) else ""
+            with st.expander(f"{qid} — {q['domain']} — {q['topic']}{label}"):
                 st.write(q["question"])
                 st.write("**Your answer:**", f"{chr(65+a)}. {q['options'][a]}")
                 st.write("**Correct answer:**", f"{chr(65+correct)}. {q['options'][correct]}")
@@ -476,86 +463,155 @@ if idx >= len(questions):
     else:
         st.success("✅ No incorrect answers. Nice.")
 
-    st.stop()
-
-q = questions[idx]
-qid = q["id"]
-
-st.progress((idx + 1) / len(questions))
-top_cols = st.columns([2, 1, 1])
-with top_cols[0]:
-    st.subheader(f"Question {idx + 1} of {len(questions)}")
-with top_cols[1]:
-    st.caption("Domain")
-    st.write(f"**{q['domain']}**")
-with top_cols[2]:
-    st.caption("Score")
-    st.write(f"**{st.session_state.score}**")
 
-st.caption(f"Topic: {q['topic']}")
-st.write(q["question"])
-
-already_answered = qid in st.session_state.answered
+@st.fragment
+@METRICS.timed("question_panel")
+def question_panel():
+    # Radio, Confirm and Skip rerun only this panel.
+    quiz = st.session_state.quiz
+    idx = st.session_state.idx
+    q = quiz.question(idx)
+    qid = q["id"]
+
+    st.progress((idx + 1) / len(quiz))
+    top_cols = st.columns([2, 1, 1])
+    with top_cols[0]:
+        st.subheader(f"Question {idx + 1} of {len(quiz)}")
+    with top_cols[1]:
+        st.caption("Domain")
+        st.write(f"**{q['domain']}**")
+    with top_cols[2]:
+        st.caption("Score")
+        st.write(f"**{quiz.score}**")
+
+    with st.expander("📊 Stats so far"):
+        render_stats(quiz)
+
+    st.caption(f"Topic: {q['topic']}")
+    st.write(q["question"])
+
+    already_answered = quiz.is_answered(idx)
+
+    if already_answered:
+        selected = quiz.selected[idx]
+        correct = q["answer_index"]
+        is_correct = quiz.is_correct(idx)
+        skipped = quiz.is_skipped(idx)
+
+        st.radio(
+            "Select one answer:",
+            options=list(range(len(q["options"]))),
+            format_func=lambda i: f"{chr(65+i)}. {q['options'][i]}",
+            index=selected,
+            disabled=True,
+            key=f"radio_{qid}",
+        )
+
+        if skipped:
+            st.warning("Skipped — saved for review as incorrect (no score added).")
+        else:
+            st.success("✅ Correct") if is_correct else st.error("❌ Incorrect")
 
-if already_answered:
-    selected = st.session_state.answered[qid]["selected"]
-    correct = q["answer_index"]
-    is_correct = st.session_state.answered[qid]["correct"]
+        st.write("**Explanation:**")
+        st.write(q["explanation"])
+        st.write("**Correct answer:**", f"{chr(65+correct)}. {q['options'][correct]}")
 
+    else:
+        st.radio(
+            "Select one answer:",
+            options=list(range(len(q["options"]))),
+            format_func=lambda i: f"{chr(65+i)}. {q['options'][i]}",
+            index=0,
+            key=f"radio_{qid}",
+        )
+
+        mark_shown(("quiz", idx))
+        c1, c2 = st.columns([1, 1])
+        # Answers are recorded in on_click callbacks, before the panel reruns,
+        # so the score and stats above already include them.
+        c1.button("✅ Confirm", use_container_width=True, on_click=submit_answer, args=(idx, f"radio_{qid}"))
+        c2.button("⏭️ Skip", use_container_width=True, on_click=submit_answer, args=(idx, f"radio_{qid}", True))
+
+
+def submit_answer(idx: int, radio_key: str, skipped: bool = False):
+    quiz = st.session_state.quiz
+    q = quiz.question(idx)
+    selected = st.session_state[radio_key]
+    if skipped:
+        # Mark as skipped (no score impact; reviewed as incorrect)
+        quiz.skip(idx, selected)
+        METRICS.inc("answers_skipped")
+        log_attempt(q, selected, False, skipped=True)
+    else:
+        is_correct = quiz.answer(idx, selected)
+        METRICS.inc("answers_confirmed")
+        log_attempt(q, selected, is_correct)
+
+
+@st.fragment
+@METRICS.timed("review_panel")
+def review_panel():
+    # The scheduler picks every question; grading reschedules it and its topic.
+    review = st.session_state.review
+    last = st.session_state.review_last
+    i = last[0] if last else review.next()
+    q = review.question(i)
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Reviewed", review.reviewed)
+    c2.metric("Accuracy", f"{review.correct / review.reviewed:.0%}" if review.reviewed else "—")
+    c3.metric("Unseen", review.new_count)
+    if review.reviewed:
+        weakest = sorted(review.topic_ease().items(), key=lambda item: item[1])[:3]
+        st.caption("Weakest topics: " + ", ".join(f"{topic} (ease {ease:.1f})" for topic, ease in weakest))
+
+    st.divider()
+    st.caption(f"{q['domain']} — Topic: {q['topic']}")
+    st.write(q["question"])
+    radio_key = f"review_{review.reviewed}_{last is None}"
     st.radio(
         "Select one answer:",
         options=list(range(len(q["options"]))),
-        format_func=lambda i: f"{chr(65+i)}. {q['options'][i]}",
-        index=selected,
-        disabled=True,
-        key=f"radio_{qid}",
+        format_func=lambda k: f"{chr(65+k)}. {q['options'][k]}",
+        index=last[1] if last else 0,
+        disabled=last is not None,
+        key=radio_key,
     )
 
-    st.success("✅ Correct") if is_correct else st.error("❌ Incorrect")
+    if last is None:
+        mark_shown(("review", review.reviewed))
+        c1, c2 = st.columns([1, 1])
+        # Graded in on_click callbacks, before the panel reruns, so the
+        # counts above already include the answer.
+        c1.button("✅ Confirm", use_container_width=True, on_click=grade_review, args=(i, radio_key))
+        c2.button("⏭️ Skip", use_container_width=True, on_click=grade_review, args=(i, radio_key, True))
+        return
 
+    correct = q["answer_index"]
+    st.success("✅ Correct") if last[2] else st.error("❌ Incorrect")
     st.write("**Explanation:**")
     st.write(q["explanation"])
     st.write("**Correct answer:**", f"{chr(65+correct)}. {q['options'][correct]}")
+    st.button("➡️ Next question", use_container_width=True, on_click=next_review)
 
-else:
-    selected = st.radio(
-        "Select one answer:",
-        options=list(range(len(q["options"]))),
-        format_func=lambda i: f"{chr(65+i)}. {q['options'][i]}",
-        index=0,
-        key=f"radio_{qid}",
-    )
-
-    c1, c2 = st.columns([1, 1])
-    confirm = c1.button("✅ Confirm", use_container_width=True)
-    skip = c2.button("⏭️ Skip", use_container_width=True)
-
-    if confirm:
-        correct_index = q["answer_index"]
-        is_correct = (selected == correct_index)
-        st.session_state.answered[qid] = {"selected": selected, "correct": is_correct}
-        if is_correct:
-            st.session_state.score += 1
-            st.success("✅ Correct")
-        else:
-            st.error("❌ Incorrect")
 
-        st.write("**Explanation:**")
-        st.write(q["explanation"])
-        st.write("**Correct answer:**", f"{chr(65+correct_index)}. {q['options'][correct_index]}")
+def grade_review(i: int, radio_key: str, skipped: bool = False):
+    review = st.session_state.review
+    q = review.question(i)
+    selected = st.session_state[radio_key]
+    # A skip counts as a miss, as in the quiz.
+    is_correct = not skipped and selected == q["answer_index"]
+    review.review(i, is_correct)
+    METRICS.inc("reviews")
+    log_attempt(q, selected, is_correct, skipped=skipped)
+    st.session_state.review_last = (i, selected, is_correct)
 
-    if skip:
-        # Mark as skipped (no score impact; reviewed as incorrect)
-        st.session_state.answered[qid] = {"selected": selected, "correct": False}
-        st.warning("Skipped — saved for review as incorrect (no score added).")
 
-st.divider()
-nav1, nav2 = st.columns([1, 1])
+def next_review():
+    st.session_state.review_last = None
 
-if nav1.button("⬅️ Previous", use_container_width=True, disabled=(idx == 0)):
-    st.session_state.idx -= 1
-    st.rerun()
 
-if nav2.button("➡️ Next", use_container_width=True):
-    st.session_state.idx += 1
-    st.rerun()
+if st.session_state.mode == "review":
+    review_panel()
+else:
+    quiz_view()
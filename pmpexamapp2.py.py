@@ -1,356 +1,3031 @@
+import atexit
+import bisect
+import codecs
+import contextlib
+import csv
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import queue
 import random
+import re
+import sqlite3
+import string
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: only the "numpy" backend needs it
+    np = None
 
 DOMAINS = ["Process", "People", "Business Environment"]
 
+# Share of a bank per domain, similar to PMP ECO weighting
+_DOMAIN_WEIGHTS = (0.50, 0.40, 0.10)
 
-def _vars(rng: random.Random):
-    names = ["Aisha", "Miguel", "Chen", "Priya", "Omar", "Sofia", "Liam", "Fatima", "Kenji", "Elena", "Ravi", "Noah"]
-    industries = ["healthcare", "fintech", "manufacturing", "telecom", "retail", "energy", "public sector", "education"]
-    approaches = ["predictive", "agile", "hybrid"]
-    phases = ["initiating", "planning", "execution", "monitoring and controlling", "closing", "an iteration", "a sprint review"]
-    sizes = ["a small", "a major", "an urgent", "a late-breaking"]
-    return {
-        "name": rng.choice(names),
-        "industry": rng.choice(industries),
-        "approach": rng.choice(approaches),
-        "phase": rng.choice(phases),
-        "size": rng.choice(sizes),
-    }
+# Bump whenever templates or generation logic change so cached banks are not reused.
+GENERATOR_VERSION = 6
+
+# Scenario variables, in draw order. A question stores its picks as one packed int.
+_VAR_POOLS = (
+    ("name", ("Aisha", "Miguel", "Chen", "Priya", "Omar", "Sofia", "Liam", "Fatima", "Kenji", "Elena", "Ravi", "Noah")),
+    ("industry", ("healthcare", "fintech", "manufacturing", "telecom", "retail", "energy", "public sector", "education")),
+    ("approach", ("predictive", "agile", "hybrid")),
+    ("phase", ("initiating", "planning", "execution", "monitoring and controlling", "closing", "an iteration", "a sprint review")),
+    ("size", ("a small", "a major", "an urgent", "a late-breaking")),
+)
+_VAR_SLOTS = {key: k for k, (key, _) in enumerate(_VAR_POOLS)}
+_VAR_COMBOS = math.prod(len(pool) for _, pool in _VAR_POOLS)
+# Mixed-radix place value of each variable inside a packed var code
+_VAR_STRIDES = tuple(math.prod(len(pool) for _, pool in _VAR_POOLS[k + 1:]) for k in range(len(_VAR_POOLS)))
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: int):
+    # splitmix64 finalizer: a cheap, well-distributed 64-bit hash.
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _item_hash(seed: int, stream: int, counter: int):
+    """
+    Counter-based random value for one item: depends only on its inputs, so any
+    item can be produced without drawing the ones before it.
+    """
+    return _mix64(_mix64(_mix64(seed & _MASK64) ^ stream) ^ counter)
+
+
+def _permute(i: int, n: int, key: int):
+    """
+    Keyed bijection on range(n), evaluated in O(1) per element: a 4-round
+    Feistel network over the next even bit width, cycle-walked back into range.
+    """
+    bits = max(2, (n - 1).bit_length())
+    bits += bits & 1
+    half = bits // 2
+    mask = (1 << half) - 1
+    while True:
+        left, right = i >> half, i & mask
+        for r in range(4):
+            left, right = right, left ^ (_mix64(key ^ (r << 56) ^ right) & mask)
+        i = (left << half) | right
+        if i < n:
+            return i
+
+
+class Template(NamedTuple):
+    """
+    Precompiled question template. The question text is split once, at import,
+    into literal parts and scenario-variable slots, so rendering is a join.
+    """
+
+    domain: str
+    topic: str
+    text: str
+    parts: tuple  # literal text around the slots; len(parts) == len(slots) + 1
+    slots: tuple  # index into _VAR_POOLS for each placeholder
+    options: tuple
+    answer_index: int
+    explanation: str
+
+    def render(self, var_code: int = 0):
+        if not self.slots:
+            return self.text
+        out = [self.parts[0]]
+        for k, part in zip(self.slots, self.parts[1:]):
+            pool = _VAR_POOLS[k][1]
+            out.append(pool[var_code // _VAR_STRIDES[k] % len(pool)])
+            out.append(part)
+        return "".join(out)
+
+
+def _compile_template(domain: str, raw: dict):
+    """
+    Parses and validates one raw template dict. Raises ValueError for unknown
+    placeholders, format specs or a bad answer index.
+    """
+    parts, slots = [""], []
+    for literal, field, spec, conversion in string.Formatter().parse(raw["q"]):
+        parts[-1] += literal
+        if field is None:
+            continue
+        if field not in _VAR_SLOTS or spec or conversion:
+            raise ValueError(f"{domain} / {raw['topic']}: unsupported placeholder {{{field}}}")
+        slots.append(_VAR_SLOTS[field])
+        parts.append("")
+    if not 0 <= raw["answer"] < len(raw["options"]):
+        raise ValueError(f"{domain} / {raw['topic']}: answer index out of range")
+    return Template(
+        domain=domain,
+        topic=raw["topic"],
+        text="".join(parts),
+        parts=tuple(parts),
+        slots=tuple(slots),
+        options=tuple(raw["options"]),
+        answer_index=raw["answer"],
+        explanation=raw["exp"],
+    )
+
+
+class Question(Mapping):
+    """
+    Compact, read-only question record.
 
+    Only small integers are stored: domain, template, question number and the
+    packed scenario variables. Topic, options and explanation come from the
+    shared Template; id and question text are rendered when accessed.
+    Reads like the dict schema of generate_question_bank.
+    """
+
+    __slots__ = ("domain_index", "template_index", "number", "var_code")
+
+    FIELDS = ("id", "domain", "topic", "question", "options", "answer_index", "explanation")
+
+    def __init__(self, domain_index: int, template_index: int, number: int, var_code: int = 0):
+        self.domain_index = domain_index
+        self.template_index = template_index
+        self.number = number
+        self.var_code = var_code
+
+    @property
+    def template(self):
+        return _DOMAIN_TEMPLATES[self.domain_index][self.template_index]
+
+    @property
+    def id(self):
+        return f"{_ID_PREFIXES[self.domain_index]}{self.number:03d}"
+
+    @property
+    def key(self):
+        """
+        Content key, the same in every bank that holds this question:
+        "<id prefix><template>:<var code>", with the variables the template
+        does not use zeroed, so Question(domain, template, 0, var code)
+        renders it. Ids only number questions within one bank.
+        """
+        t = self.template
+        index = _TEMPLATE_KEYS.get(t)
+        if index is None:
+            return self.id  # not a registry template (imported questions)
+        return f"{_ID_PREFIXES[DOMAINS.index(t.domain)]}{index}:{_used_code(_used_radices(t.slots), self.var_code)}"
+
+    @property
+    def domain(self):
+        return DOMAINS[self.domain_index]
+
+    @property
+    def topic(self):
+        return self.template.topic
+
+    @property
+    def question(self):
+        return self.template.render(self.var_code)
+
+    @property
+    def options(self):
+        return self.template.options
+
+    @property
+    def answer_index(self):
+        return self.template.answer_index
+
+    @property
+    def explanation(self):
+        return self.template.explanation
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
 
-def generate_question_bank(total: int = 200, seed: int = 7):
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return f"<Question {self.id} {self.domain} / {self.topic}>"
+
+
+class _BoundQuestion(Question):
+    # Question whose template comes from a bank-specific table (e.g. a bank
+    # file) instead of the module registry.
+    __slots__ = ("table",)
+
+    def __init__(self, domain_index: int, template_index: int, number: int, var_code: int, table):
+        super().__init__(domain_index, template_index, number, var_code)
+        self.table = table
+
+    @property
+    def template(self):
+        return self.table[self.template_index]
+
+
+def generate_question_bank(
+    total: int = 200, seed: int = 7, domains=None, topics=None, backend: str = "python", unique: bool = False
+):
     """
     Returns a list of dict questions:
       {id, domain, topic, question, options, answer_index, explanation}
     Bank is created by mixing PMP-style scenario templates with varied context.
+    With domains and/or topics, all `total` questions come from the matching
+    templates only; other domains are never generated. Each domain gets its
+    exact ECO share of total and splits it over its topics in proportion to
+    their template counts (unique banks split domains only).
+    backend="numpy" builds the same bank with vectorized batch generation.
+    unique=True makes every question text distinct; see unique_capacity.
+    """
+    with METRICS.timer("generate_question_bank"):
+        if backend == "python":
+            return list(iter_question_bank(total=total, seed=seed, domains=domains, topics=topics, unique=unique))
+        bank = generate_compact_bank(total=total, seed=seed, domains=domains, topics=topics, backend=backend, unique=unique)
+        return [dict(q) for q in bank]
+
+
+def iter_question_bank(total: int = 200, seed: int = 7, domains=None, topics=None, unique: bool = False):
+    """
+    Yields the same questions as generate_question_bank, one at a time.
+    Memory use does not grow with total, so very large pools can be streamed
+    and cut short with itertools.islice. Order is deterministic per seed.
+    """
+    return (dict(q) for q in iter_compact_bank(total=total, seed=seed, domains=domains, topics=topics, unique=unique))
+
+
+def iter_compact_bank(total: int = 200, seed: int = 7, domains=None, topics=None, unique: bool = False):
+    """
+    Like iter_question_bank, but yields compact Question records.
+    Filters and unique capacity are checked here, before the first question.
+    """
+    plan = _filter_plan(domains, topics)
+    counts = _domain_counts(total, plan, unique)
+    key = _item_hash(seed, _ORDER_STREAM, total)
+    return (_question_at(seed, index, total, plan, counts, key, unique) for index in range(total))
+
+
+def get_question(seed: int, index: int, total: int = 200, domains=None, topics=None, unique: bool = False):
+    """
+    Returns question `index` of the (total, seed) bank in O(1), without
+    generating the questions before it. Results match iter_compact_bank, so
+    sessions and stored attempts can keep just (seed, index).
+    """
+    if not 0 <= index < total:
+        raise IndexError("question index out of range")
+    plan = _filter_plan(domains, topics)
+    key = _item_hash(seed, _ORDER_STREAM, total)
+    return _question_at(seed, index, total, plan, _domain_counts(total, plan, unique), key, unique)
+
+
+def distinct_bank(domains=None, topics=None):
+    """
+    Returns every distinct question the generator can produce for the
+    filters as a CompactBank, template by template; its size per domain is
+    unique_capacity. Seeded banks only ever hold questions from it.
+    """
+    columns = (array("B"), array("B"), array("I"), array("H"))
+    for d, templates in _filter_plan(domains, topics):
+        number = 0
+        for t, radices in zip(templates, _unique_space(d, templates)[1]):
+            for digits in itertools.product(*(range(size) for _, size in radices)):
+                number += 1
+                columns[0].append(d)
+                columns[1].append(t)
+                columns[2].append(number)
+                columns[3].append(sum(digit * stride for digit, (stride, _) in zip(digits, radices)))
+    return CompactBank(*columns)
+
+
+def unique_capacity(domains=None, topics=None):
+    """
+    Returns {domain: number of distinct questions} for the filters: every
+    matching template times the combinations of the scenario variables it
+    actually uses. A unique bank can hold at most this many per domain.
+    """
+    return {DOMAINS[d]: _unique_space(d, templates)[0][-1] for d, templates in _filter_plan(domains, topics)}
+
+
+def max_unique_total(domains=None, topics=None):
+    """
+    Returns the largest total for which a unique bank with these filters
+    exists. Domain shares follow the ECO weights, so the smallest domain
+    relative to its weight usually sets the limit.
+    """
+    return _max_unique_total(_filter_plan(domains, topics))
+
+
+def _max_unique_total(plan):
+    capacity = [_unique_space(d, templates)[0][-1] for d, templates in plan]
+    total = sum(capacity)
+    while any(n > c for n, c in zip(_domain_counts(total, plan), capacity)):
+        total -= 1
+    return total
+
+
+def _filter_plan(domains=None, topics=None):
+    """
+    Resolves domain/topic filters through TOPIC_INDEX into a tuple of
+    (domain index, allowed template indices) for every domain with a match.
+    The result is canonical and hashable, so it doubles as a cache key.
+    """
+    if domains is None and topics is None:
+        return _FULL_PLAN
+    if domains is not None and not set(domains) <= set(DOMAINS):
+        raise ValueError(f"Unknown domains: {sorted(set(domains) - set(DOMAINS))}")
+    if topics is not None and not set(topics) <= _ALL_TOPICS:
+        raise ValueError(f"Unknown topics: {sorted(set(topics) - _ALL_TOPICS)}")
+
+    plan = []
+    for d, domain in enumerate(DOMAINS):
+        if domains is not None and domain not in domains:
+            continue
+        allowed = sorted(
+            i
+            for topic, templates in TOPIC_INDEX[domain].items()
+            if topics is None or topic in topics
+            for i in templates
+        )
+        if allowed:
+            plan.append((d, tuple(allowed)))
+    if not plan:
+        raise ValueError("No questions match the selected domains and topics.")
+    return tuple(plan)
+
+
+def _domain_counts(total: int, plan, unique: bool = False):
+    counts = _eco_counts(total, plan)
+    if unique:
+        for (d, templates), n in zip(plan, counts):
+            capacity = _unique_space(d, templates)[0][-1]
+            if n > capacity:
+                raise ValueError(
+                    f"A unique bank of {total} needs {n} {DOMAINS[d]} questions, but only "
+                    f"{capacity} distinct ones exist for these filters "
+                    f"(largest unique total: {_max_unique_total(plan)})."
+                )
+    return counts
+
+
+@functools.lru_cache(maxsize=1024)
+def _eco_counts(total: int, plan):
+    # ECO weights, renormalised over the domains in the plan, by largest
+    # remainder like BankStrata quotas
+    return tuple(_apportion(total, [_DOMAIN_WEIGHTS[d] for d, _ in plan], [total] * len(plan)))
+
+
+def _question_at(seed: int, index: int, total: int, plan, counts, key: int, unique: bool = False):
+    # The bank is laid out domain by domain (Process, People, Business);
+    # a keyed permutation shuffles positions (still deterministic per seed).
+    slot = _permute(index, total, key)
+    for (d, templates), n in zip(plan, counts):
+        if slot < n:
+            if unique:
+                return _make_unique_question(d, seed, slot + 1, templates)
+            return _make_question(d, seed, slot + 1, templates, n)
+        slot -= n
+
+
+class BankCache:
+    """
+    Bounded, thread-safe LRU cache of read-only question banks (tuples of
+    Question records) keyed by (total, seed, filters, GENERATOR_VERSION).
+    Banks are evicted least recently used first once there are more than
+    maxsize of them or, with max_bytes, once their estimated size exceeds it.
+
+    Concurrent misses on the same key build the bank once; the other callers
+    wait for that build instead of generating their own copy.
+
+    prefetch() builds banks on a small background thread pool so a later
+    get() is a hit. A prefetch with the same tag as a pending one (e.g. one
+    tag per user session) cancels the older one: a queued job never runs and
+    a running build stops at its next chunk, unless a get() is waiting on it.
     """
+
+    def __init__(self, maxsize: int = 32, max_bytes: int = None, workers: int = 2):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+        self.prefetch_hits = 0
+        self.cancelled = 0
+        self.nbytes = 0
+        self._banks = OrderedDict()  # key -> (bank, estimated bytes)
+        self._building = {}  # key -> _Build
+        self._unused_prefetches = set()
+        self._tags = {}  # tag -> (future, key, _Build) of its latest prefetch
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self, total: int = 200, seed: int = 7, domains=None, topics=None, unique: bool = False):
+        key = (total, seed, _filter_plan(domains, topics), unique, GENERATOR_VERSION)
+        while True:
+            with self._lock:
+                bank = self._lookup(key)
+                if bank is not None:
+                    self.hits += 1
+                    METRICS.inc("bank_cache_hits")
+                    if key in self._unused_prefetches:
+                        self._unused_prefetches.discard(key)
+                        self.prefetch_hits += 1
+                    return bank
+                pending = self._building.get(key)
+                if pending is None:
+                    self.misses += 1
+                    METRICS.inc("bank_cache_misses")
+                    pending = self._building[key] = _Build(wanted=True)
+                    break
+                pending.wanted = True  # a cancelled prefetch must finish for us
+            # Another thread is generating this bank; wait and look again.
+            pending.done.wait()
+        return self._build(key, pending, total, seed, domains, topics, unique)
+
+    def prefetch(self, total: int = 200, seed: int = 7, domains=None, topics=None, unique: bool = False, tag=None):
+        """
+        Schedules a background build of the bank and returns its Future, or
+        None when the bank is already cached or being built. Filter and
+        capacity errors are raised here, not in the background.
+        """
+        plan = _filter_plan(domains, topics)
+        _domain_counts(total, plan, unique)
+        key = (total, seed, plan, unique, GENERATOR_VERSION)
+        if tag is not None:
+            with self._lock:
+                pending = self._tags.get(tag)
+            if pending is not None and pending[1] == key:
+                return None  # same settings again: keep the build under way
+            self._cancel(tag)
+        with self._lock:
+            if key in self._banks or key in self._building:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pmp-prefetch")
+            # The _Build exists from now on, so a cancel can reach it even
+            # before the job registers it as building.
+            build = _Build(wanted=False)
+            future = self._executor.submit(self._prefetch, key, build, total, seed, domains, topics, unique)
+            if tag is not None:
+                self._tags[tag] = (future, key, build)
+                future.add_done_callback(functools.partial(self._forget, tag))
+            return future
+
+    def _forget(self, tag, future):
+        with self._lock:
+            if self._tags.get(tag, (None,))[0] is future:
+                del self._tags[tag]
+
+    def _prefetch(self, key, build, total, seed, domains, topics, unique):
+        with self._lock:
+            if key in self._banks or key in self._building:
+                return None
+            self._building[key] = build
+        bank = self._build(key, build, total, seed, domains, topics, unique)
+        if bank is not None:
+            with self._lock:
+                self.prefetched += 1
+                self._unused_prefetches.add(key)
+        return bank
+
+    def _cancel(self, tag):
+        # Future.cancel() runs done callbacks (_forget) at once, so it is
+        # called without holding the lock.
+        with self._lock:
+            future, _, build = self._tags.pop(tag, (None, None, None))
+        if future is None:
+            return
+        if future.cancel():
+            with self._lock:
+                self.cancelled += 1
+            return
+        with self._lock:
+            if not build.wanted:
+                build.cancel.set()
+
+    def _build(self, key, build, total, seed, domains, topics, unique):
+        # Builds in chunks so a cancelled, unwanted prefetch stops early; the
+        # build is always unregistered and its waiters woken.
+        try:
+            with METRICS.timer("bank_cache_build"):
+                questions = iter_compact_bank(total=total, seed=seed, domains=domains, topics=topics, unique=unique)
+                parts = []
+                for _ in range(0, total, _BUILD_CHUNK):
+                    if build.cancel.is_set() and not build.wanted:
+                        with self._lock:
+                            self.cancelled += 1
+                        return None
+                    parts.extend(itertools.islice(questions, _BUILD_CHUNK))
+                bank = tuple(parts)
+            with self._lock:
+                self._store(key, bank)
+            return bank
+        finally:
+            with self._lock:
+                del self._building[key]
+            build.done.set()
+
+    def _lookup(self, key):
+        # Caller holds the lock.
+        entry = self._banks.get(key)
+        if entry is None:
+            return None
+        self._banks.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key, bank):
+        # Caller holds the lock.
+        size = _bank_bytes(bank)
+        self._banks[key] = (bank, size)
+        self.nbytes += size
+        while len(self._banks) > 1 and (
+            len(self._banks) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            old_key, (_, old_size) = self._banks.popitem(last=False)
+            self.nbytes -= old_size
+            self._unused_prefetches.discard(old_key)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._banks),
+                "maxsize": self.maxsize,
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "prefetched": self.prefetched,
+                "prefetch_hits": self.prefetch_hits,
+                "cancelled": self.cancelled,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._banks.clear()
+            self._unused_prefetches.clear()
+            self.nbytes = 0
+
+
+# Questions generated between cancellation checks of a background build
+_BUILD_CHUNK = 4096
+
+
+class _Build:
+    __slots__ = ("done", "cancel", "wanted")
+
+    def __init__(self, wanted: bool):
+        self.done = threading.Event()
+        self.cancel = threading.Event()
+        self.wanted = wanted  # a get() needs this bank: ignore cancellation
+
+
+def _bank_bytes(bank):
+    # Estimated memory of a cached tuple of Question records.
+    if not bank:
+        return sys.getsizeof(bank)
+    q = bank[0]
+    return sys.getsizeof(bank) + len(bank) * (sys.getsizeof(q) + sys.getsizeof(q.var_code))
+
+
+# -----------------------------
+# Batch generation
+# -----------------------------
+class CompactBank(Sequence):
+    """
+    Read-only bank stored as four parallel columns (domain, template, number,
+    var code). Question records are only created, and their text only
+    rendered, when an item is accessed.
+    """
+
+    __slots__ = ("domain_index", "template_index", "number", "var_code")
+
+    def __init__(self, domain_index, template_index, number, var_code):
+        self.domain_index = domain_index
+        self.template_index = template_index
+        self.number = number
+        self.var_code = var_code
+
+    def __len__(self):
+        return len(self.number)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return Question(int(self.domain_index[i]), int(self.template_index[i]), int(self.number[i]), int(self.var_code[i]))
+
+
+def generate_compact_bank(
+    total: int = 200,
+    seed: int = 7,
+    domains=None,
+    topics=None,
+    backend: str = "python",
+    workers: int = 1,
+    shard_size: int = 65_536,
+    unique: bool = False,
+):
+    """
+    Returns the (total, seed) bank as a CompactBank.
+
+    backend="python" fills array.array columns one question at a time;
+    backend="numpy" draws every template and variable index for the bank in
+    one vectorized pass and requires NumPy. Both produce identical banks.
+
+    With workers > 1 the bank positions are split into shards of shard_size
+    and built in a process pool. Every question depends only on (seed, its
+    position), so shards are independent and, concatenated in order, give
+    the same bank as a single process, whatever the worker count.
+
+    unique=True banks are always built by the python backend; they are capped
+    by unique_capacity, well below sizes where NumPy pays off.
+    """
+    if backend not in ("python", "numpy"):
+        raise ValueError(f"Unknown backend: {backend!r}")
+    if backend == "numpy" and np is None:
+        raise ImportError("backend='numpy' requires NumPy (pip install numpy)")
+    plan = _filter_plan(domains, topics)
+    _domain_counts(total, plan, unique)  # fail fast, before any worker starts
+    if unique:
+        backend = "unique"
+    with METRICS.timer("generate_compact_bank"):
+        if workers <= 1 or total <= shard_size:
+            return _generate_shard(total, seed, plan, 0, total, backend)
+
+        bounds = [(start, min(start + shard_size, total)) for start in range(0, total, shard_size)]
+        # The module may be loaded from a file that is not importable by name
+        # (pmpexamapp2.py.py), so workers inherit it by forking where possible.
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            shards = pool.map(
+                _generate_shard,
+                *zip(*[(total, seed, plan, start, stop, backend) for start, stop in bounds]),
+            )
+            return _concat_banks(list(shards))
+
+
+def _generate_shard(total: int, seed: int, plan, start: int, stop: int, backend: str):
+    # Positions [start, stop) of the (total, seed) bank; backend "unique" is
+    # the python loop over unique-mode questions.
+    if backend == "numpy":
+        return _generate_numpy(total, seed, plan, start, stop)
+    unique = backend == "unique"
+    counts = _domain_counts(total, plan, unique)
+    key = _item_hash(seed, _ORDER_STREAM, total)
+    columns = (array("B"), array("B"), array("I"), array("H"))
+    for index in range(start, stop):
+        q = _question_at(seed, index, total, plan, counts, key, unique)
+        columns[0].append(q.domain_index)
+        columns[1].append(q.template_index)
+        columns[2].append(q.number)
+        columns[3].append(q.var_code)
+    return CompactBank(*columns)
+
+
+def _concat_banks(banks):
+    columns = []
+    for field in CompactBank.__slots__:
+        parts = [getattr(bank, field) for bank in banks]
+        if isinstance(parts[0], array):
+            column = array(parts[0].typecode)
+            for part in parts:
+                column.extend(part)
+        else:
+            column = np.concatenate(parts)
+        columns.append(column)
+    return CompactBank(*columns)
+
+
+def _mix64_array(x):
+    # Same splitmix64 finalizer as _mix64; uint64 arithmetic wraps mod 2**64.
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _permute_array(i, n: int, key: int):
+    # Vectorized _permute: every element runs the Feistel rounds, then only the
+    # ones still outside range(n) walk again.
+    bits = max(2, (n - 1).bit_length())
+    bits += bits & 1
+    half = np.uint64(bits // 2)
+    mask = np.uint64((1 << (bits // 2)) - 1)
+    out = i.astype(np.uint64)
+    pending = np.arange(len(out))
+    while len(pending):
+        x = out[pending]
+        left, right = x >> half, x & mask
+        for r in range(4):
+            left, right = right, left ^ (_mix64_array(np.uint64(key ^ (r << 56)) ^ right) & mask)
+        out[pending] = (left << half) | right
+        pending = pending[out[pending] >= n]
+    return out
+
+
+def _generate_numpy(total: int, seed: int, plan, start: int = 0, stop: int = None):
+    counts = _domain_counts(total, plan)
+    positions = np.arange(start, total if stop is None else stop, dtype=np.uint64)
+    slots = _permute_array(positions, total, _item_hash(seed, _ORDER_STREAM, total))
+
+    # Map each bank slot to its plan entry and its number within that domain.
+    ends = np.cumsum(counts, dtype=np.uint64)
+    part = np.searchsorted(ends, slots, side="right")
+    number = slots - (ends - np.asarray(counts, dtype=np.uint64))[part] + np.uint64(1)
+
+    # Topic of each number, as in _make_question: one row of `lookup` per
+    # (plan entry, topic) holds that topic's templates.
+    splits = [_topic_split(d, templates, n, seed) for (d, templates), n in zip(plan, counts)]
+    groups = [group for _, entry_groups in splits for group in entry_groups]
+    first = np.cumsum([0] + [len(entry_groups) for _, entry_groups in splits[:-1]])
+    row = np.zeros(len(number), dtype=np.intp)
+    for p, (ends, _) in enumerate(splits):
+        in_part = part == p
+        row[in_part] = first[p] + np.searchsorted(np.asarray(ends, dtype=np.uint64), number[in_part], side="left")
+
+    # Same per-item hash as _make_question: _mix64(_mix64(_mix64(seed) ^ d) ^ number).
+    seed_hash = _mix64(seed & _MASK64)
+    bases = np.array([_mix64(seed_hash ^ d) for d, _ in plan], dtype=np.uint64)
+    h = _mix64_array(bases[part] ^ number)
+    n_templates = np.array([len(group) for group in groups], dtype=np.uint64)[row]
+    lookup = np.zeros((len(groups), max(len(group) for group in groups)), dtype=np.uint8)
+    for r, group in enumerate(groups):
+        lookup[r, : len(group)] = group
+
+    return CompactBank(
+        np.array([d for d, _ in plan], dtype=np.uint8)[part],
+        lookup[row, (h % n_templates).astype(np.intp)],
+        number.astype(np.uint32),
+        ((h // n_templates) % np.uint64(_VAR_COMBOS)).astype(np.uint16),
+    )
+
+
+def sample_bank(bank, n: int, seed: int = 7, domains=None, topics=None):
+    """
+    Returns the positions of up to n questions in an existing bank (any
+    sequence of Question records, e.g. a MappedBank) that match the filters,
+    in a seeded order, stratified by domain and topic (see BankStrata).
+    Indexing the bank is O(len(bank)); to sample one bank repeatedly, keep a
+    BankStrata and call its sample(), which is O(n).
+    """
+    return BankStrata(bank).sample(n, seed=seed, domains=domains, topics=topics)
+
+
+class BankStrata:
+    """
+    Positions of an existing bank grouped by (domain, topic), built in one
+    pass, for stratified samples in O(n).
+
+    sample() gives each domain its exact ECO share of n (renormalised over
+    the matching domains) and splits it over the domain's topics in
+    proportion to their size, the seed drawing which topics get the
+    remainder seats (see _apportion). A stratum short of its
+    quota passes the rest on to the others. Each stratum is then drawn from
+    a keyed permutation of its positions and the picks are shuffled the same
+    way, so nothing outside the sample is touched and a seed always gives
+    the same quiz.
+    """
+
+    def __init__(self, bank):
+        templates, gids, _ = _bank_columns(bank)
+        self.size = len(bank)
+        # Strata in (domain, topic) order, so a pool samples the same whether
+        # it is a CompactBank or the bank file it was saved to.
+        self.strata = sorted({(DOMAINS.index(t.domain), t.topic) for t in templates})
+        rank = {key: s for s, key in enumerate(self.strata)}
+        stratum_of = [rank[DOMAINS.index(t.domain), t.topic] for t in templates]
+        with METRICS.timer("bank_strata_build"):
+            if np is not None:
+                codes = np.asarray(stratum_of, dtype=np.intp)[np.asarray(gids, dtype=np.intp)]
+                order = np.argsort(codes, kind="stable").astype(np.uint32)
+                bounds = np.searchsorted(codes[order], np.arange(len(self.strata) + 1))
+                self.positions = [array("I", order[lo:hi].tobytes()) for lo, hi in zip(bounds[:-1], bounds[1:])]
+            else:
+                self.positions = [array("I") for _ in self.strata]
+                for position, g in enumerate(gids):
+                    self.positions[stratum_of[g]].append(position)
+
+    def __len__(self):
+        return self.size
+
+    def quotas(self, n: int, seed: int = 7, domains=None, topics=None):
+        """
+        Returns {(domain, topic): count} for sample(n, seed, ...); counts add
+        up to min(n, matching questions).
+        """
+        return {
+            (DOMAINS[d], topic): q
+            for (d, topic), q in zip(self.strata, self._quotas(n, domains, topics, seed))
+            if q
+        }
+
+    def sample(self, n: int, seed: int = 7, domains=None, topics=None):
+        """
+        Returns the positions of up to n matching questions in a seeded,
+        stratified order.
+        """
+        with METRICS.timer("sample_bank"):
+            picks = array("I")
+            for s, q in enumerate(self._quotas(n, domains, topics, seed)):
+                positions = self.positions[s]
+                key = _item_hash(seed, _SAMPLE_STREAM, s)
+                picks.extend(positions[_permute(j, len(positions), key)] for j in range(q))
+            key = _item_hash(seed, _SAMPLE_STREAM, len(picks))
+            return [picks[_permute(j, len(picks), key)] for j in range(len(picks))]
+
+    def _quotas(self, n: int, domains, topics, seed: int, sizes=None):
+        # sizes: questions available per stratum (default: all its positions)
+        sizes = [
+            size if (domains is None or DOMAINS[d] in domains) and (topics is None or topic in topics) else 0
+            for (d, topic), size in zip(self.strata, sizes or [len(positions) for positions in self.positions])
+        ]
+        by_domain = [0] * len(DOMAINS)
+        for (d, _), size in zip(self.strata, sizes):
+            by_domain[d] += size
+        domain_quota = _apportion(min(n, sum(sizes)), [w if by_domain[d] else 0 for d, w in enumerate(_DOMAIN_WEIGHTS)], by_domain)
+        quotas = [0] * len(sizes)
+        for d, total in enumerate(domain_quota):
+            members = [s for s, (sd, _) in enumerate(self.strata) if sd == d]
+            weights = [sizes[s] for s in members]
+            for s, q in zip(members, _apportion(total, weights, weights, _item_hash(seed, _QUOTA_STREAM, d))):
+                quotas[s] = q
+        return quotas
+
+
+def _apportion(total: int, weights, caps, key: int = None):
+    """
+    Splits total into integer shares proportional to weights, none above its
+    cap. Every entry gets the whole part of its exact share; the seats left
+    over go by largest remainder (ties to the lower index) or, given a key,
+    by systematic sampling over a keyed order of the entries: each wins a
+    seat with probability equal to its remainder, so near-equal entries take
+    turns across keys instead of the same ones always winning. The caller
+    keeps total <= sum of caps; shares a cap cuts off go to the uncapped
+    entries.
+    """
+    shares = [0] * len(weights)
+    open_ = [i for i, w in enumerate(weights) if w > 0 and caps[i] > 0]
+    left = total
+    while left and open_:
+        scale = sum(weights[i] for i in open_)
+        exact = {i: left * weights[i] / scale for i in open_}
+        grant = {i: min(int(exact[i]), caps[i] - shares[i]) for i in open_}
+        rest = left - sum(grant.values())
+        room = [i for i in open_ if grant[i] < caps[i] - shares[i]]
+        if key is None:
+            for i in sorted(room, key=lambda i: (grant[i] - exact[i], i))[:rest]:
+                grant[i] += 1
+        elif rest:
+            room.sort(key=lambda i: _permute(i, len(weights), key))
+            point, reached = _mix64(key) / 2**64, 0.0
+            for i in room:
+                reached += exact[i] - grant[i]
+                if reached > point and rest:
+                    grant[i] += 1
+                    rest -= 1
+                    point += 1
+            if not any(grant.values()):
+                grant[room[0]] = 1  # rounding left every remainder short of the point
+        for i in open_:
+            shares[i] += grant[i]
+            left -= grant[i]
+        open_ = [i for i in open_ if shares[i] < caps[i]]
+    return shares
+
+
+# -----------------------------
+# Quiz state
+# -----------------------------
+class QuizState:
+    """
+    Compact progress of one quiz: a reference to a shared bank, the positions
+    of the quiz questions in it, and per question one byte for the selected
+    option plus answered/correct/skipped bits.
+
+    Results are kept as running aggregates, updated on every answer or skip,
+    so score, tallies and the wrong-answer list cost O(1) to read however
+    long the quiz is. Skipped questions count as answered but not correct;
+    they are reviewed with the wrong answers but counted separately.
+    """
+
+    __slots__ = (
+        "bank", "order", "selected", "answered", "correct", "skipped",
+        "wrong", "skipped_count", "domain_tally", "topic_tally",
+    )
+
+    def __init__(self, bank, order=None):
+        self.bank = bank
+        self.order = array("H" if len(bank) <= 0xFFFF else "I", range(len(bank)) if order is None else order)
+        n = len(self.order)
+        self.selected = bytearray(n)
+        self.answered = bytearray((n + 7) // 8)
+        self.correct = bytearray((n + 7) // 8)
+        self.skipped = bytearray((n + 7) // 8)
+        self.wrong = []  # quiz positions answered wrongly or skipped, in quiz order
+        self.skipped_count = 0
+        self.domain_tally = [[0, 0] for _ in DOMAINS]  # [correct, answered] per domain index
+        self.topic_tally = {}  # topic -> [correct, answered]
+
+    def __len__(self):
+        return len(self.order)
+
+    def question(self, i: int):
+        return self.bank[self.order[i]]
+
+    def answer(self, i: int, selected: int):
+        """
+        Records option `selected` for question i and returns whether it is correct.
+        """
+        q = self.question(i)
+        is_correct = selected == q.answer_index
+        self._record(i, q, selected, is_correct, False)
+        return is_correct
+
+    def skip(self, i: int, selected: int = 0):
+        self._record(i, self.question(i), selected, False, True)
+
+    def _record(self, i: int, q, selected: int, is_correct: bool, skipped: bool):
+        if self.is_answered(i):
+            self._tally(i, q, -1)
+        self.selected[i] = selected
+        _set_bit(self.answered, i, True)
+        _set_bit(self.correct, i, is_correct)
+        _set_bit(self.skipped, i, skipped)
+        self._tally(i, q, 1)
+
+    def _tally(self, i: int, q, sign: int):
+        # Adds (sign=1) or removes (sign=-1) question i's current result.
+        is_correct = self.is_correct(i)
+        for tally in (self.domain_tally[q.domain_index], self.topic_tally.setdefault(q.topic, [0, 0])):
+            tally[0] += sign * is_correct
+            tally[1] += sign
+        if self.is_skipped(i):
+            self.skipped_count += sign
+        if not is_correct:
+            if sign > 0:
+                bisect.insort(self.wrong, i)
+            else:
+                self.wrong.remove(i)
+
+    def is_answered(self, i: int):
+        return _get_bit(self.answered, i)
+
+    def is_correct(self, i: int):
+        return _get_bit(self.correct, i)
+
+    def is_skipped(self, i: int):
+        return _get_bit(self.skipped, i)
+
+    @property
+    def score(self):
+        return sum(correct for correct, _ in self.domain_tally)
+
+    @property
+    def answered_count(self):
+        return sum(answered for _, answered in self.domain_tally)
+
+    @property
+    def incorrect_count(self):
+        # Wrong answers, not counting skips
+        return len(self.wrong) - self.skipped_count
+
+    @property
+    def by_domain(self):
+        return {DOMAINS[d]: Tally(c, n) for d, (c, n) in enumerate(self.domain_tally) if n}
+
+    @property
+    def by_topic(self):
+        return {topic: Tally(c, n) for topic, (c, n) in self.topic_tally.items() if n}
+
+    def incorrect(self):
+        """
+        Positions in the quiz answered wrongly or skipped, in quiz order.
+        """
+        return list(self.wrong)
+
+    def selections(self):
+        """
+        Per-question selections in grade_batch form: the chosen option,
+        SKIPPED or UNANSWERED.
+        """
+        out = array("b", self.selected)
+        for i in range(len(self)):
+            if not self.is_answered(i):
+                out[i] = UNANSWERED
+            elif self.is_skipped(i):
+                out[i] = SKIPPED
+        return out
+
+
+def _get_bit(bits: bytearray, i: int):
+    return bool(bits[i >> 3] >> (i & 7) & 1)
+
+
+def _set_bit(bits: bytearray, i: int, value: bool):
+    if value:
+        bits[i >> 3] |= 1 << (i & 7)
+    else:
+        bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+
+# -----------------------------
+# Grading
+# -----------------------------
+# Special values in a selections array
+UNANSWERED = -1  # not counted at all
+SKIPPED = -2  # counted as answered and wrong
+
+
+class Tally(NamedTuple):
+    correct: int
+    total: int
+
+    @property
+    def accuracy(self):
+        return self.correct / self.total if self.total else 0.0
+
+
+class GradeReport(NamedTuple):
+    score: int
+    answered: int
+    by_domain: dict  # domain -> Tally
+    by_topic: dict  # topic -> Tally
+    wrong: list  # indices into question_ids answered wrongly or skipped
+
+
+def grade_batch(bank, question_ids, selections):
+    """
+    Grades many answers in one pass. question_ids are positions in bank and
+    selections the chosen option for each (or SKIPPED / UNANSWERED).
+
+    The answer key is gathered as arrays (column lookups for CompactBank and
+    MappedBank) and compared in bulk with NumPy when available. Returns a
+    GradeReport with the score, per-domain and per-topic tallies and the
+    wrong answers.
+    """
+    domains, topics, answers, topic_names = _answer_key(bank, question_ids)
+    if np is not None:
+        selections = np.asarray(selections, dtype=np.int64)
+        answered = selections != UNANSWERED
+        correct = answered & (selections == answers)
+        domain_total = np.bincount(domains[answered], minlength=len(DOMAINS))
+        domain_correct = np.bincount(domains[correct], minlength=len(DOMAINS))
+        topic_total = np.bincount(topics[answered], minlength=len(topic_names))
+        topic_correct = np.bincount(topics[correct], minlength=len(topic_names))
+        wrong = np.flatnonzero(answered & ~correct).tolist()
+    else:
+        domain_total, domain_correct = [0] * len(DOMAINS), [0] * len(DOMAINS)
+        topic_total, topic_correct = [0] * len(topic_names), [0] * len(topic_names)
+        wrong = []
+        for i, (d, t, a, s) in enumerate(zip(domains, topics, answers, selections)):
+            if s == UNANSWERED:
+                continue
+            domain_total[d] += 1
+            topic_total[t] += 1
+            if s == a:
+                domain_correct[d] += 1
+                topic_correct[t] += 1
+            else:
+                wrong.append(i)
+
+    return GradeReport(
+        score=int(sum(domain_correct)),
+        answered=int(sum(domain_total)),
+        by_domain={DOMAINS[d]: Tally(int(domain_correct[d]), int(n)) for d, n in enumerate(domain_total) if n},
+        by_topic={topic_names[t]: Tally(int(topic_correct[t]), int(n)) for t, n in enumerate(topic_total) if n},
+        wrong=wrong,
+    )
+
+
+def _answer_key(bank, question_ids):
+    # Domain index, topic code and correct option per question, plus the
+    # topic names the codes refer to.
+    if isinstance(bank, (CompactBank, MappedBank)):
+        if isinstance(bank, CompactBank):
+            templates = [t for ts in _DOMAIN_TEMPLATES for t in ts]
+            offsets = [0]
+            for ts in _DOMAIN_TEMPLATES:
+                offsets.append(offsets[-1] + len(ts))
+        else:
+            templates = list(bank.templates)
+        topic_names = list(dict.fromkeys(t.topic for t in templates))
+        luts = (
+            [DOMAINS.index(t.domain) for t in templates],
+            [topic_names.index(t.topic) for t in templates],
+            [t.answer_index for t in templates],
+        )
+        if np is not None:
+            ids = np.asarray(question_ids, dtype=np.intp)
+            if isinstance(bank, CompactBank):
+                gid = np.asarray(offsets, dtype=np.intp)[np.asarray(bank.domain_index)[ids]] + np.asarray(bank.template_index)[ids]
+            else:
+                gid = np.asarray(bank.template_index)[ids].astype(np.intp)
+            return tuple(np.asarray(lut, dtype=np.int64)[gid] for lut in luts) + (topic_names,)
+        if isinstance(bank, CompactBank):
+            gids = [offsets[bank.domain_index[i]] + bank.template_index[i] for i in question_ids]
+        else:
+            gids = [bank.template_index[i] for i in question_ids]
+        return tuple([lut[g] for g in gids] for lut in luts) + (topic_names,)
+
+    topic_names, topic_codes = [], {}
+    domains, topics, answers = [], [], []
+    for i in question_ids:
+        q = bank[i]
+        if q.topic not in topic_codes:
+            topic_codes[q.topic] = len(topic_names)
+            topic_names.append(q.topic)
+        domains.append(q.domain_index)
+        topics.append(topic_codes[q.topic])
+        answers.append(q.answer_index)
+    if np is not None:
+        return np.asarray(domains, dtype=np.int64), np.asarray(topics, dtype=np.int64), np.asarray(answers, dtype=np.int64), topic_names
+    return domains, topics, answers, topic_names
+
+
+# -----------------------------
+# Search
+# -----------------------------
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    ("a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the", "to", "with")
+)
+_FIELD_WEIGHTS = (3, 1, 2)  # question text, options, explanation
+_OR_WORDS = ("OR", "|")
+
+
+def _tokens(text: str):
+    return [w for w in _TOKEN_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class SearchHit(NamedTuple):
+    position: int  # index into the searched bank
+    score: float
+    copies: int = 1  # positions holding this question, with distinct=True
+
+
+class SearchResult(NamedTuple):
+    total: int  # matching questions, before the limit
+    hits: list  # best SearchHit first
+
+
+class SearchIndex:
+    """
+    Inverted index for keyword search over the question text, options and
+    explanations of one bank (a CompactBank, a MappedBank or any sequence of
+    Question records).
+
+    Questions are never rendered: each template is tokenized once and each
+    scenario variable value once, and the bank is indexed as posting lists of
+    positions per template and per (template, variable, value). A query is
+    resolved template by template, so only the postings of templates that
+    match through a variable are intersected.
+
+    Query syntax: words are ANDed, OR (or |) separates alternatives, and a
+    trailing * matches any word with that prefix. Results are ranked by
+    tf-idf, with the question text weighted above explanations and options.
+    """
+
+    def __init__(self, bank):
+        templates, gids, codes = _bank_columns(bank)
+        self.bank = bank
+        self.templates = templates
+        self.size = len(bank)
+        self._slots = [tuple(sorted(set(t.slots))) for t in templates]
+        self._radices = [_used_radices(t.slots) for t in templates]
+        self._gids, self._codes = array("H", gids), array("H", codes)  # for distinct searches
+        self._postings = [array("I") for _ in templates]
+        self._var_postings = {}  # (template, slot, value) -> positions
+        with METRICS.timer("search_index_build"):
+            for position, (g, code) in enumerate(zip(gids, codes)):
+                self._postings[g].append(position)
+                for k in self._slots[g]:
+                    key = (g, k, code // _VAR_STRIDES[k] % len(_VAR_POOLS[k][1]))
+                    postings = self._var_postings.get(key)
+                    if postings is None:
+                        postings = self._var_postings[key] = array("I")
+                    postings.append(position)
+
+            # token -> {template: weighted term frequency} for literal text
+            self._literal = {}
+            for g, t in enumerate(templates):
+                fields = (" ".join(t.parts), " ".join(t.options), t.explanation)
+                for weight, text in zip(_FIELD_WEIGHTS, fields):
+                    for token in _tokens(text):
+                        tf = self._literal.setdefault(token, {})
+                        tf[g] = tf.get(g, 0) + weight
+            # token -> ((slot, value), ...) for scenario variables
+            self._variables = {}
+            for k, (_, pool) in enumerate(_VAR_POOLS):
+                for v, value in enumerate(pool):
+                    for token in dict.fromkeys(_tokens(value)):
+                        self._variables.setdefault(token, []).append((k, v))
+            self._vocabulary = sorted(self._literal.keys() | self._variables.keys())
+            self._idf = {token: math.log(1 + self.size / max(1, self._df(token))) for token in self._vocabulary}
+
+    def __len__(self):
+        return self.size
+
+    def search(self, query: str, domains=None, topics=None, limit: int = 20, distinct: bool = False):
+        """
+        Returns a SearchResult with the total number of matches and the best
+        `limit` hits (highest score first, then bank order); hit positions
+        index self.bank. domains and topics restrict the search like the quiz
+        filters. With distinct=True, positions holding the same question (see
+        Question.key) count once, as a hit at the first of them whose copies
+        says how many there are.
+        """
+        scores = {}
+        with METRICS.timer("search"):
+            groups = self._parse(query)
+            allowed = [
+                g
+                for g, t in enumerate(self.templates)
+                if (domains is None or t.domain in domains) and (topics is None or t.topic in topics)
+            ]
+            for terms in groups:
+                for g in allowed:
+                    for position, score in self._match(g, terms).items():
+                        scores[position] = scores.get(position, 0.0) + score
+            copies = {}
+            if distinct:
+                # Copies score alike: same template, same variable values.
+                first = {}
+                for position in sorted(scores):
+                    g = self._gids[position]
+                    kept = first.setdefault((g, _used_code(self._radices[g], self._codes[position])), position)
+                    copies[kept] = copies.get(kept, 0) + 1
+                scores = {position: scores[position] for position in copies}
+            best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        hits = [SearchHit(position, round(score, 4), copies.get(position, 1)) for position, score in best]
+        return SearchResult(len(scores), hits)
+
+    def _parse(self, query: str):
+        # -> list of OR groups; each group is a list of AND terms, and each
+        # term the tuple of indexed tokens that satisfy it.
+        groups, terms = [], []
+        for word in query.split():
+            if word in _OR_WORDS:
+                if terms:
+                    groups.append(terms)
+                terms = []
+                continue
+            tokens = _TOKEN_RE.findall(word.lower())
+            prefix = word.endswith("*") and bool(tokens)
+            for token in tokens[:-1] if prefix else tokens:
+                if token not in _STOPWORDS:
+                    terms.append((token,))
+            if prefix:
+                lo = bisect.bisect_left(self._vocabulary, tokens[-1])
+                hi = bisect.bisect_left(self._vocabulary, tokens[-1] + "~")
+                terms.append(tuple(self._vocabulary[lo:hi]))
+        if terms:
+            groups.append(terms)
+        return groups
+
+    def _match(self, g: int, terms):
+        # -> {position: score} of template g's questions that satisfy every term
+        base = 0.0
+        constrained = []
+        for term in terms:
+            literal = 0.0
+            for token in term:
+                tf = self._literal.get(token)
+                if tf is not None and g in tf:
+                    literal += tf[g] * self._idf[token]
+            if literal:
+                base += literal
+                continue
+            # Only a scenario variable can satisfy this term.
+            scores = {}
+            for token in term:
+                weight = _FIELD_WEIGHTS[0] * self._idf.get(token, 0.0)
+                for k, v in self._variables.get(token, ()):
+                    for position in self._var_postings.get((g, k, v), ()):
+                        scores[position] = scores.get(position, 0.0) + weight
+            if not scores:
+                return {}
+            constrained.append(scores)
+        if not constrained:
+            return dict.fromkeys(self._postings[g], base)
+        constrained.sort(key=len)
+        matches = constrained[0]
+        for scores in constrained[1:]:
+            matches = {position: score + scores[position] for position, score in matches.items() if position in scores}
+        return {position: score + base for position, score in matches.items()}
+
+    def _df(self, token: str):
+        # Number of questions in the bank that contain token.
+        tf = self._literal.get(token, {})
+        n = sum(len(self._postings[g]) for g in tf)
+        for k, v in self._variables.get(token, ()):
+            n += sum(len(self._var_postings.get((g, k, v), ())) for g in range(len(self.templates)) if g not in tf)
+        return n
+
+
+def _bank_columns(bank):
+    # -> (template table, template column, var code column) for any bank
+    if isinstance(bank, CompactBank):
+        templates = [t for ts in _DOMAIN_TEMPLATES for t in ts]
+        offsets = [0]
+        for ts in _DOMAIN_TEMPLATES:
+            offsets.append(offsets[-1] + len(ts))
+        gids = [offsets[d] + t for d, t in zip(bank.domain_index.tolist(), bank.template_index.tolist())]
+        return templates, gids, bank.var_code.tolist()
+    if isinstance(bank, MappedBank):
+        return list(bank.templates), bank.template_index, bank.var_code
+    templates, table, gids, codes = [], {}, array("I"), array("I")
+    for q in bank:
+        t = q.template
+        g = table.get(id(t))
+        if g is None:
+            g = table[id(t)] = len(templates)
+            templates.append(t)
+        gids.append(g)
+        codes.append(q.var_code)
+    return templates, gids, codes
+
+
+def _question_keys(bank, columns=None):
+    # Content identity per position: (template, used variable code), so equal
+    # keys are the same question; imported questions are told apart by id.
+    # columns: _bank_columns(bank), if the caller has it already.
+    if isinstance(bank, ImportedBank):
+        return bank.ids
+    templates, gids, codes = columns or _bank_columns(bank)
+    radices = [_used_radices(t.slots) for t in templates]
+    return [(g, _used_code(radices[g], c)) for g, c in zip(gids, codes)]
+
+
+# -----------------------------
+# Spaced repetition
+# -----------------------------
+_START_EASE = 2.5
+_MIN_EASE = 1.3
+_EASE_UP = 0.10  # per correct answer
+_EASE_DOWN = 0.20  # per wrong answer or skip
+_LAPSE_DELAY = 60.0  # seconds before a missed question comes back
+_FIRST_INTERVALS = (600.0, 86_400.0)  # after the 1st and 2nd correct answer in a row
+_TOPIC_MIN_INTERVAL = 30.0  # a topic answered correctly rests at least this long
+
+
+class ReviewScheduler:
+    """
+    SM-2 style spaced repetition over the questions of a bank.
+
+    Every question and every topic has an ease factor and a due time (in
+    time.time() seconds). Topics sit in one heap ordered by due time. Each
+    topic keeps a heap of its reviewed questions by due time plus a queue of
+    unseen ones in seeded order. next() takes the most overdue topic, then a
+    due review in it, else an unseen question, else its earliest review: two
+    heap peeks, O(log n) amortised.
+
+    A wrong answer lowers the ease of the question and of its topic and makes
+    the topic due at once, so weak topics come back more often. Rescheduling
+    pushes a fresh heap entry; stale entries are dropped when they reach the
+    top (each entry carries a sequence number, the newest one per item wins).
+    """
+
+    __slots__ = (
+        "bank", "positions", "topic_names", "_topic_of", "_ease", "_interval", "_due", "_streak",
+        "_entry", "_seen", "_new", "_reviews", "_topics", "_topic_ease", "_topic_interval",
+        "_topic_entry", "_seq", "reviewed", "correct", "new_count",
+    )
+
+    def __init__(self, bank, positions=None, seed: int = 7):
+        self.bank = bank
+        self.positions = array("I", range(len(bank)) if positions is None else positions)
+        n = len(self.positions)
+        _, topics, _, self.topic_names = _answer_key(bank, self.positions)
+        self._topic_of = array("H", [int(t) for t in topics])
+        self._ease = array("f", [_START_EASE]) * n
+        self._interval = array("d", [0.0]) * n
+        self._due = array("d", [0.0]) * n
+        self._streak = array("H", [0]) * n
+        self._entry = array("Q", [0]) * n  # sequence number of the live heap entry
+        self._seen = bytearray(n)
+        self.reviewed = 0
+        self.correct = 0
+        self.new_count = n
+
+        # Unseen questions per topic, popped from the end in seeded order.
+        k = len(self.topic_names)
+        self._new = [array("I") for _ in range(k)]
+        key = _item_hash(seed, _REVIEW_STREAM, n)
+        for r in range(n - 1, -1, -1):
+            i = _permute(r, n, key)
+            self._new[self._topic_of[i]].append(i)
+        self._reviews = [[] for _ in range(k)]  # per topic: (due, seq, item)
+        self._topic_ease = [_START_EASE] * k
+        self._topic_interval = [0.0] * k
+        self._topic_entry = list(range(k))
+        self._topics = [(0.0, code, code) for code in range(k) if self._new[code]]  # (due, seq, topic)
+        self._seq = k
+
+    def __len__(self):
+        return len(self.positions)
+
+    def question(self, i: int):
+        return self.bank[self.positions[i]]
+
+    def next(self, now: float = None):
+        """
+        Returns the item to ask next (an index into positions), or None for an
+        empty pool. The item stays scheduled until review() grades it.
+        """
+        now = time.time() if now is None else now
+        topics = self._topics
+        while topics:
+            _, seq, code = topics[0]
+            if seq != self._topic_entry[code]:
+                heapq.heappop(topics)
+                continue
+            reviews = self._reviews[code]
+            while reviews and reviews[0][1] != self._entry[reviews[0][2]]:
+                heapq.heappop(reviews)
+            if reviews and reviews[0][0] <= now:
+                return reviews[0][2]
+            new = self._new[code]
+            while new and self._seen[new[-1]]:
+                new.pop()
+            if new:
+                return new[-1]
+            return reviews[0][2]
+        return None
+
+    def review(self, i: int, correct: bool, now: float = None):
+        """
+        Grades item i (a skip counts as wrong) and reschedules it and its topic.
+        """
+        now = time.time() if now is None else now
+        if not self._seen[i]:
+            self._seen[i] = 1
+            self.new_count -= 1
+        self.reviewed += 1
+        self.correct += bool(correct)
+
+        if correct:
+            self._streak[i] += 1
+            streak = self._streak[i]
+            interval = _FIRST_INTERVALS[streak - 1] if streak <= len(_FIRST_INTERVALS) else self._interval[i] * self._ease[i]
+            self._ease[i] = self._ease[i] + _EASE_UP
+        else:
+            self._streak[i] = 0
+            interval = _LAPSE_DELAY
+            self._ease[i] = max(_MIN_EASE, self._ease[i] - _EASE_DOWN)
+        self._interval[i] = interval
+        self._due[i] = now + interval
+        self._seq += 1
+        self._entry[i] = self._seq
+        code = self._topic_of[i]
+        heapq.heappush(self._reviews[code], (now + interval, self._seq, i))
+
+        if correct:
+            self._topic_interval[code] = max(_TOPIC_MIN_INTERVAL, self._topic_interval[code] * self._topic_ease[code])
+            self._topic_ease[code] += _EASE_UP
+        else:
+            self._topic_interval[code] = 0.0
+            self._topic_ease[code] = max(_MIN_EASE, self._topic_ease[code] - _EASE_DOWN)
+        self._seq += 1
+        self._topic_entry[code] = self._seq
+        heapq.heappush(self._topics, (now + self._topic_interval[code], self._seq, code))
+
+    def due(self, i: int):
+        # Due time of item i; 0.0 while it has never been reviewed.
+        return self._due[i]
+
+    def topic_ease(self):
+        """
+        Returns {topic: ease factor}; the lowest are the weakest topics.
+        """
+        return dict(zip(self.topic_names, self._topic_ease))
+
+
+# -----------------------------
+# Exam forms
+# -----------------------------
+# Costs a form assembly minimises; one unit is one shared question between two
+# forms (squared, so overlap is spread evenly), one duplicate template on a
+# form, or one percentage point between a form's mean difficulty and the pool's.
+_REPEAT_COST = 1.0
+_DIFFICULTY_COST = 1.0
+
+
+class FormReport(NamedTuple):
+    blueprint: dict  # {(domain, topic): questions per form}
+    by_domain: dict  # {domain: questions per form}
+    off_blueprint: int  # (form, stratum) counts that differ from the blueprint
+    distinct: int  # different questions over all forms
+    reused: int  # questions on two or more forms
+    max_overlap: int  # most questions any two forms share
+    mean_overlap: float  # shared questions per pair of forms
+    repeated_templates: int  # questions whose template already appears on the same form
+    difficulty_spread: float  # max - min form mean difficulty; None without difficulty
+    cost: float
+
+
+class ExamForms(NamedTuple):
+    forms: list  # per form, positions in the pool
+    report: FormReport
+
+
+def assemble_forms(
+    bank,
+    forms: int,
+    questions: int,
+    seed: int = 7,
+    domains=None,
+    topics=None,
+    difficulty=None,
+    candidates: int = 4,
+    workers: int = 1,
+    iterations: int = None,
+    strata=None,
+):
+    """
+    Assembles `forms` equivalent exam forms of `questions` each from one pool
+    (any bank; pass a prebuilt BankStrata as strata to reuse it).
+
+    Questions are told apart by content, not pool position: a question the
+    pool holds at several positions is one candidate, and overlap, distinct
+    and reused in the report count questions. Every form gets exactly the
+    blueprint of BankStrata quotas over those distinct questions: the ECO
+    domain shares and the pool's topic mix. Within that, the assignment
+    keeps questions shared between forms to a minimum and evenly spread,
+    avoids two questions from one template on a form and, given difficulty
+    ({question id: e.g. proportion correct}), evens out form mean difficulty.
+
+    Each candidate is a greedy deal of seeded, template-interleaved stratum
+    orders followed by local search (swaps within a stratum that lower the
+    cost). `candidates` seeds are solved, on `workers` processes, and the
+    cheapest wins. Returns ExamForms(forms, report); deterministic per seed.
+    """
+    if forms < 1 or questions < 1:
+        raise ValueError("forms and questions must be at least 1")
+    strata = BankStrata(bank) if strata is None else strata
+    # A pool may hold one question at many positions: each stratum offers its
+    # distinct questions once, at their first position, and the blueprint is
+    # drawn over those.
+    columns = _bank_columns(bank)
+    keys = _question_keys(bank, columns)
+    distinct = []  # per stratum: {question key: positions}
+    for positions in strata.positions:
+        copies = {}
+        for p in positions:
+            copies.setdefault(keys[p], []).append(p)
+        distinct.append(copies)
+    quotas = strata._quotas(questions, domains, topics, seed, [len(copies) for copies in distinct])
+    if not any(quotas):
+        raise ValueError("No questions match the selected domains and topics.")
+    gids = columns[1]
+    problem = []  # (positions, templates, difficulty values or None, quota) per used stratum
+    for s, quota in enumerate(quotas):
+        if quota:
+            positions = array("I", [copies[0] for copies in distinct[s].values()])
+            values = None
+            if difficulty is not None:
+                # A question's difficulty pools what is known for all its copies.
+                values = array("d")
+                for copies in distinct[s].values():
+                    known = [v for v in (float(difficulty.get(bank[p].id, "nan")) for p in copies) if v == v]
+                    values.append(sum(known) / len(known) if known else float("nan"))
+            problem.append((positions, array("I", [gids[p] for p in positions]), values, quota))
+    if iterations is None:
+        iterations = 20 * forms * sum(quotas)
+
+    seeds = [_item_hash(seed, _FORMS_STREAM, c) for c in range(max(1, candidates))]
+    with METRICS.timer("assemble_forms"):
+        if workers <= 1 or len(seeds) == 1:
+            solved = [_solve_forms(problem, forms, s, iterations) for s in seeds]
+        else:
+            # Same fork-where-possible pool as generate_compact_bank.
+            context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                solved = list(pool.map(_solve_forms, *zip(*[(problem, forms, s, iterations) for s in seeds])))
+        cost, best = min(solved, key=lambda item: item[0])
+    return ExamForms(best, _form_report(strata, quotas, problem, best, cost))
+
+
+def _solve_forms(problem, k: int, seed: int, iterations: int):
+    # One candidate: greedy assignment, then local search. -> (cost, forms)
+    template_of, value_of, stratum_of, members = {}, {}, {}, []
+    values = [v for _, _, vs, _ in problem if vs is not None for v in vs if v == v]
+    mean = sum(values) / len(values) if values else 0.0
+    forms = [[] for _ in range(k)]
+    floor = 0.0  # no assignment can cost less: repeats a stratum's templates force
+    for s, (positions, templates, vs, quota) in enumerate(problem):
+        m = len(positions)
+        members.append(positions)
+        floor += _REPEAT_COST * k * max(0, quota - len(set(templates)))
+        for j, p in enumerate(positions):
+            template_of[p] = templates[j]
+            stratum_of[p] = s
+            if vs is not None:
+                value_of[p] = vs[j] if vs[j] == vs[j] else mean  # unknown: pool mean
+        # Greedy: the first min(m, k * quota) questions of a seeded order,
+        # interleaved by template, dealt to the forms in consecutive runs of
+        # `quota`. Reuse only starts once every question is used, and a run
+        # never repeats a question because quota <= m.
+        key = _item_hash(seed, _FORMS_STREAM, s)
+        by_template = {}
+        for j in range(min(m, k * quota)):
+            j = _permute(j, m, key)
+            by_template.setdefault(templates[j], []).append(positions[j])
+        order = [p for run in itertools.zip_longest(*by_template.values()) for p in run if p is not None]
+        for f in range(k):
+            forms[f].extend(order[(f * quota + j) % len(order)] for j in range(quota))
+
+    # Incremental cost terms
+    where = {}  # position -> forms holding it
+    repeats = [{} for _ in range(k)]  # per form: template -> count
+    sums = [0.0] * k  # per form: difficulty total
+    for f, form in enumerate(forms):
+        for p in form:
+            where.setdefault(p, []).append(f)
+            repeats[f][template_of[p]] = repeats[f].get(template_of[p], 0) + 1
+            sums[f] += value_of.get(p, 0.0)
+    overlap = [[0] * k for _ in range(k)]
+    for holders in where.values():
+        for a, b in itertools.combinations(holders, 2):
+            overlap[a][b] += 1
+            overlap[b][a] += 1
+    n = len(forms[0])
+    target = n * mean
+    scale = _DIFFICULTY_COST * (100.0 / n) ** 2 if value_of else 0.0
+
+    def cost():
+        total = sum(overlap[a][b] ** 2 for a in range(k) for b in range(a + 1, k))
+        total += _REPEAT_COST * sum(c - 1 for counts in repeats for c in counts.values() if c > 1)
+        return total + scale * sum((x - target) ** 2 for x in sums)
+
+    current = cost()
     rng = random.Random(seed)
+    for _ in range(iterations):
+        if current <= floor:
+            break
+        f = rng.randrange(k)
+        slot = rng.randrange(n)
+        old = forms[f][slot]
+        pool = members[stratum_of[old]]
+        new = pool[rng.randrange(len(pool))]
+        if f in where.get(new, ()):
+            continue
+        delta = 0.0
+        changed = {}
+        for g in where[old]:
+            if g != f:
+                changed[g] = overlap[f][g] - 1
+        for g in where.get(new, ()):
+            before = changed.get(g, overlap[f][g])
+            changed[g] = before + 1
+        for g, after in changed.items():
+            delta += after * after - overlap[f][g] ** 2
+        t_old, t_new = template_of[old], template_of[new]
+        if t_old != t_new:
+            delta += _REPEAT_COST * ((repeats[f].get(t_new, 0) > 0) - (repeats[f][t_old] > 1))
+        if scale:
+            moved = sums[f] - value_of[old] + value_of[new]
+            delta += scale * ((moved - target) ** 2 - (sums[f] - target) ** 2)
+        if delta > 0:
+            continue
+        # Apply the swap.
+        for g, after in changed.items():
+            overlap[f][g] = overlap[g][f] = after
+        where[old].remove(f)
+        where.setdefault(new, []).append(f)
+        repeats[f][t_old] -= 1
+        repeats[f][t_new] = repeats[f].get(t_new, 0) + 1
+        if scale:
+            sums[f] = moved
+        forms[f][slot] = new
+        current += delta
+    return cost(), forms
+
+
+def _form_report(strata, quotas, problem, forms, cost):
+    k = len(forms)
+    blueprint = {
+        (DOMAINS[d], topic): quota for (d, topic), quota in zip(strata.strata, quotas) if quota
+    }
+    by_domain = {}
+    for (domain, _), quota in blueprint.items():
+        by_domain[domain] = by_domain.get(domain, 0) + quota
+    template_of, value_of, stratum_of = {}, {}, {}
+    for s, (positions, templates, values, _) in enumerate(problem):
+        for j, p in enumerate(positions):
+            template_of[p] = templates[j]
+            stratum_of[p] = s
+            if values is not None and values[j] == values[j]:
+                value_of[p] = values[j]
+
+    off_blueprint = repeated = 0
+    uses, means = {}, []
+    for form in forms:
+        counts = [0] * len(problem)
+        for p in form:
+            counts[stratum_of[p]] += 1
+            uses[p] = uses.get(p, 0) + 1
+        off_blueprint += sum(c != quota for c, (_, _, _, quota) in zip(counts, problem))
+        repeated += len(form) - len({template_of[p] for p in form})
+        known = [value_of[p] for p in form if p in value_of]
+        if known:
+            means.append(sum(known) / len(known))
+    sets = [set(form) for form in forms]
+    pairs = [len(a & b) for a, b in itertools.combinations(sets, 2)]
+    return FormReport(
+        blueprint=blueprint,
+        by_domain=by_domain,
+        off_blueprint=off_blueprint,
+        distinct=len(uses),
+        reused=sum(1 for n in uses.values() if n > 1),
+        max_overlap=max(pairs, default=0),
+        mean_overlap=round(sum(pairs) / len(pairs), 3) if pairs else 0.0,
+        repeated_templates=repeated,
+        difficulty_spread=round(max(means) - min(means), 4) if means else None,
+        cost=round(cost, 3),
+    )
+
+
+# -----------------------------
+# Attempt store (SQLite)
+# -----------------------------
+_ATTEMPT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    question_key TEXT,
+    domain TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    selected INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    seconds REAL,
+    answered_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_user ON attempts (user, answered_at);
+CREATE INDEX IF NOT EXISTS attempts_topic ON attempts (topic);
+CREATE INDEX IF NOT EXISTS attempts_time ON attempts (answered_at);
+"""
+# Rollups kept in step with attempts by the writer, in the same transaction:
+# per learner, UTC day and topic, plus one running total per learner whose
+# answered count doubles as the version of that learner's cached summary.
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    user TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    domain TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    answered INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (user, day, domain, topic)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS learners (
+    user TEXT PRIMARY KEY,
+    answered INTEGER NOT NULL,
+    correct INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+_ROLLUP_UPSERT = """
+INSERT INTO rollups (user, day, domain, topic, answered, correct, skipped, seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user, day, domain, topic) DO UPDATE SET
+    answered = answered + excluded.answered,
+    correct = correct + excluded.correct,
+    skipped = skipped + excluded.skipped,
+    seconds = seconds + excluded.seconds
+"""
+_LEARNER_UPSERT = """
+INSERT INTO learners (user, answered, correct) VALUES (?, ?, ?)
+ON CONFLICT (user) DO UPDATE SET answered = answered + excluded.answered, correct = correct + excluded.correct
+"""
+_ROLLUP_BACKFILL = """
+INSERT INTO rollups
+SELECT user, CAST(answered_at / 86400 AS INTEGER), domain, topic, COUNT(*), SUM(correct), SUM(skipped), TOTAL(seconds)
+FROM attempts GROUP BY 1, 2, 3, 4;
+INSERT INTO learners SELECT user, COUNT(*), SUM(correct) FROM attempts GROUP BY user;
+"""
+# Version 2 adds question_key: question ids are only unique within one bank,
+# so questions are grouped by content key. Older rows keep a NULL key.
+_KEY_MIGRATION = """
+DROP INDEX IF EXISTS attempts_question;
+CREATE INDEX IF NOT EXISTS attempts_question_key ON attempts (question_key);
+"""
+_SCHEMA_VERSION = 2  # PRAGMA user_version once the rollups and question keys exist
+_ATTEMPT_COLUMNS = (
+    "user", "mode", "seed", "question_id", "question_key", "domain", "topic",
+    "selected", "correct", "skipped", "seconds", "answered_at",
+)
+_ATTEMPT_INSERT = f"INSERT INTO attempts ({', '.join(_ATTEMPT_COLUMNS)}) VALUES ({', '.join('?' * len(_ATTEMPT_COLUMNS))})"
+_STOP_WRITER = object()
+_store_log = logging.getLogger("pmpexam.attempts")
+
+
+def _connect(path):
+    # busy_timeout lets writers in other processes (server replicas) wait
+    # for the lock instead of failing at once.
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class AttemptStore:
+    """
+    Durable log of answered questions in a SQLite database (WAL mode).
+
+    record() only puts a row on an in-memory queue and returns; one writer
+    thread per store drains the queue and inserts up to batch_size rows per
+    transaction, so Confirm and Skip never wait for the disk. A committed
+    batch survives a crash of the app process; rows still queued at that
+    moment are lost; a normal interpreter exit drains the queue first.
+    Readers use their own connections and, with WAL, do not block the
+    writer. Several processes may share one database file.
+    """
+
+    def __init__(self, path, batch_size: int = 256, flush_interval: float = 0.25):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._local = threading.local()
+        self._summaries = {}  # user -> (answered count it was built at, summary)
+        self._summaries_lock = threading.Lock()
+        with contextlib.closing(_connect(self.path)) as conn:
+            conn.executescript(_ATTEMPT_SCHEMA)
+            # Databases from before the rollups get them built once from the
+            # raw attempts; the write lock keeps other processes from doing it twice.
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < _SCHEMA_VERSION:
+                script = _KEY_MIGRATION if version else _ROLLUP_SCHEMA + _ROLLUP_BACKFILL + _KEY_MIGRATION
+                if "question_key" not in {row[1] for row in conn.execute("PRAGMA table_info(attempts)")}:
+                    conn.execute("ALTER TABLE attempts ADD COLUMN question_key TEXT")
+                for statement in script.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="pmp-attempt-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(
+        self,
+        user: str,
+        seed: int,
+        question,
+        selected: int,
+        correct: bool,
+        skipped: bool = False,
+        seconds: float = None,
+        mode: str = "quiz",
+        answered_at: float = None,
+    ):
+        """
+        Queues one attempt at a Question (or question dict) and returns at once.
+        Questions are stored with their content key; dicts carry none.
+        """
+        self._queue.put((
+            user, mode, seed, question["id"], getattr(question, "key", None), question["domain"], question["topic"], selected,
+            int(bool(correct)), int(bool(skipped)), seconds, time.time() if answered_at is None else answered_at,
+        ))
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not _STOP_WRITER:
+                    try:
+                        batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                rows = [row for row in batch if row is not _STOP_WRITER]
+                try:
+                    if rows:
+                        self._insert(conn, rows)
+                except Exception:
+                    # Whatever went wrong, the writer must outlive it: later
+                    # attempts and flush() depend on this thread.
+                    self.failed += len(rows)
+                    _store_log.exception("dropped %d attempts", len(rows))
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if batch[-1] is _STOP_WRITER:
+                    return
+        finally:
+            conn.close()
+
+    def _insert(self, conn, rows):
+        for attempt in range(3):
+            try:
+                self._commit(conn, rows)
+                self.written += len(rows)
+                return
+            except sqlite3.OperationalError as e:
+                # Still locked after busy_timeout: back off and retry the batch.
+                error = e
+                time.sleep(0.1 * (attempt + 1))
+            except sqlite3.Error as e:
+                # A bad row (e.g. a NULL choice) fails the whole transaction:
+                # write the batch row by row so only the bad rows are dropped.
+                if len(rows) > 1:
+                    for row in rows:
+                        self._insert(conn, [row])
+                    return
+                error = e
+                break
+        self.failed += len(rows)
+        _store_log.error("dropped %d attempts after write failures", len(rows), exc_info=error)
+
+    def _commit(self, conn, rows):
+        rollups, learners = {}, {}
+        for user, _, _, _, _, domain, topic, _, correct, skipped, seconds, answered_at in rows:
+            totals = rollups.setdefault((user, int(answered_at // 86400), domain, topic), [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += correct
+            totals[2] += skipped
+            totals[3] += seconds or 0.0
+            learner = learners.setdefault(user, [0, 0])
+            learner[0] += 1
+            learner[1] += correct
+        with conn:
+            conn.executemany(_ATTEMPT_INSERT, rows)
+            conn.executemany(_ROLLUP_UPSERT, [key + tuple(totals) for key, totals in rollups.items()])
+            conn.executemany(_LEARNER_UPSERT, [(user, *totals) for user, totals in learners.items()])
+
+    def flush(self):
+        """
+        Blocks until every attempt queued so far is committed (or dropped).
+        """
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP_WRITER)
+            self._thread.join()
+
+    def attempts(self, user: str = None, topic: str = None, since: float = None, limit: int = None):
+        """
+        Returns committed attempts as dicts, newest first, optionally filtered.
+        """
+        where, args = [], []
+        for column, op, value in (("user", "=", user), ("topic", "=", topic), ("answered_at", ">=", since)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                args.append(value)
+        sql = f"SELECT {', '.join(_ATTEMPT_COLUMNS)} FROM attempts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY answered_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [dict(zip(_ATTEMPT_COLUMNS, row)) for row in self._reader().execute(sql, args)]
+
+    def popular_seeds(self, n: int = 5):
+        """
+        Returns up to n seeds ordered by how many learners have used them.
+        """
+        query = "SELECT seed FROM attempts GROUP BY seed ORDER BY COUNT(DISTINCT user) DESC, seed LIMIT ?"
+        return [seed for (seed,) in self._reader().execute(query, (n,))]
+
+    def _reader(self):
+        # One read connection per thread, reused across queries.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def learner_summary(self, user: str):
+        """
+        Returns a learner's history from the rollups:
+          {answered, correct, by_domain: {domain: Tally}, by_topic: {topic: Tally},
+           trend: [(day, {domain: Tally})] oldest first, day = UTC days since 1970}
+        The result is cached per learner and rebuilt only when that learner's
+        answered count has changed, in this process or any other.
+        """
+        conn = self._reader()
+        row = conn.execute("SELECT answered, correct FROM learners WHERE user = ?", (user,)).fetchone()
+        answered = row[0] if row else 0
+        with self._summaries_lock:
+            cached = self._summaries.get(user)
+        if cached is not None and cached[0] == answered:
+            return cached[1]
+
+        by_domain, by_topic, trend = {}, {}, {}
+        query = "SELECT day, domain, topic, answered, correct FROM rollups WHERE user = ? ORDER BY day"
+        for day, domain, topic, n, c in conn.execute(query, (user,)):
+            for table, key in ((by_domain, domain), (by_topic, topic), (trend.setdefault(day, {}), domain)):
+                total = table.setdefault(key, [0, 0])
+                total[0] += c
+                total[1] += n
+        summary = {
+            "answered": answered,
+            "correct": row[1] if row else 0,
+            "by_domain": {d: Tally(*by_domain[d]) for d in DOMAINS if d in by_domain},
+            "by_topic": {t: Tally(*v) for t, v in by_topic.items()},
+            "trend": [(day, {d: Tally(*v) for d, v in domains.items()}) for day, domains in trend.items()],
+        }
+        with self._summaries_lock:
+            self._summaries[user] = (answered, summary)
+        return summary
+
+
+# -----------------------------
+# Bank files (memory-mapped)
+# -----------------------------
+# Layout, little-endian, sections 8-byte aligned:
+#   header      _BANK_HEADER
+#   templates   _BANK_TEMPLATE per template (string ids into the pool)
+#   var pools   _BANK_POOL per scenario variable
+#   strings     uint32 offsets[string_count + 1], then the UTF-8 blob
+#   records     uint16 template[count], uint16 var_code[count], uint32 number[count]
+_BANK_MAGIC = b"PMPBANK1"
+_BANK_HEADER = struct.Struct("<8sIIQIIQQQ")  # magic, generator version, templates, records, strings, pools, 3 offsets
+_BANK_TEMPLATE = struct.Struct("<BBHIIII")  # domain, answer, n_options, topic, text, explanation, first option
+_BANK_POOL = struct.Struct("<III")  # key, first value, n_values
+
+
+def _align8(n: int):
+    return (n + 7) & ~7
+
+
+def _template_source(t: Template):
+    # Inverse of _compile_template: the text with its {placeholders} restored.
+    out = [t.parts[0].replace("{", "{{").replace("}", "}}")]
+    for k, part in zip(t.slots, t.parts[1:]):
+        out.append("{" + _VAR_POOLS[k][0] + "}")
+        out.append(part.replace("{", "{{").replace("}", "}}"))
+    return "".join(out)
+
+
+def save_bank(bank, path):
+    """
+    Writes a bank (any sequence of Question records) to a compact binary file
+    that load_bank can memory-map. Template text, options and explanations
+    are stored once in a string pool; each question is 8 bytes.
+    """
+    strings, string_ids = [], {}
+
+    def intern(text):
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    templates, template_ids = [], {}
+    template_col, var_col, number_col = array("H"), array("H"), array("I")
+    for q in bank:
+        t = q.template
+        if t not in template_ids:
+            template_ids[t] = len(templates)
+            templates.append(t)
+        template_col.append(template_ids[t])
+        var_col.append(q.var_code)
+        number_col.append(q.number)
+
+    template_table = bytearray()
+    for t in templates:
+        first_option = intern(t.options[0])
+        for option in t.options[1:]:
+            intern(option)
+        # Options must be consecutive in the pool; re-add them if an earlier
+        # template interned some of them in a different order.
+        if [string_ids.get(o) for o in t.options] != list(range(first_option, first_option + len(t.options))):
+            first_option = len(strings)
+            strings.extend(t.options)
+        template_table += _BANK_TEMPLATE.pack(
+            DOMAINS.index(t.domain), t.answer_index, len(t.options),
+            intern(t.topic), intern(_template_source(t)), intern(t.explanation), first_option,
+        )
+    pool_table = bytearray()
+    for key, values in _VAR_POOLS:
+        key_id, first_value = intern(key), len(strings)
+        strings.extend(values)
+        pool_table += _BANK_POOL.pack(key_id, first_value, len(values))
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for text in strings:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+
+    strings_offset = _align8(_BANK_HEADER.size + len(template_table) + len(pool_table))
+    blob_offset = strings_offset + offsets.itemsize * len(offsets)
+    records_offset = _align8(blob_offset + len(blob))
+    header = _BANK_HEADER.pack(
+        _BANK_MAGIC, GENERATOR_VERSION, len(templates), len(number_col), len(strings), len(_VAR_POOLS),
+        strings_offset, blob_offset, records_offset,
+    )
+    if sys.byteorder != "little":
+        for column in (offsets, template_col, var_col, number_col):
+            column.byteswap()
+    with open(path, "wb") as f:
+        f.write(header + template_table + pool_table)
+        f.write(bytes(strings_offset - f.tell()))
+        offsets.tofile(f)
+        f.write(blob)
+        f.write(bytes(records_offset - f.tell()))
+        for column in (template_col, var_col, number_col):
+            column.tofile(f)
+
+
+def load_bank(path):
+    """
+    Opens a bank file written by save_bank as a MappedBank.
+    """
+    return MappedBank(path)
+
+
+class MappedBank(Sequence):
+    """
+    Read-only bank served straight from a memory-mapped bank file.
+
+    The record columns are memoryviews over the mapping, so nothing is copied
+    or generated on load and every process that opens the same file shares
+    one page-cached copy. Only the small template table is decoded.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise OSError("bank files can only be memory-mapped on little-endian machines")
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        try:
+            magic, version, n_templates, count, n_strings, n_pools, strings_at, blob_at, records_at = (
+                _BANK_HEADER.unpack_from(view)
+            )
+        except struct.error:
+            raise ValueError(f"{path}: not a question bank file") from None
+        if magic != _BANK_MAGIC:
+            raise ValueError(f"{path}: not a question bank file")
+        self.generator_version = version
+
+        offsets = view[strings_at:blob_at].cast("I")
+        blob = view[blob_at:records_at]
+
+        def text(i):
+            return str(blob[offsets[i]:offsets[i + 1]], "utf-8")
+
+        pools_at = _BANK_HEADER.size + n_templates * _BANK_TEMPLATE.size
+        pools = tuple(
+            (text(key), tuple(text(first + j) for j in range(n)))
+            for key, first, n in _BANK_POOL.iter_unpack(view[pools_at:pools_at + n_pools * _BANK_POOL.size])
+        )
+        if pools != _VAR_POOLS:
+            raise ValueError(f"{path}: scenario variables differ from this version of the question bank")
+
+        table = []
+        for d, answer, n_options, topic, source, explanation, first in _BANK_TEMPLATE.iter_unpack(
+            view[_BANK_HEADER.size:pools_at]
+        ):
+            raw = {
+                "topic": text(topic),
+                "q": text(source),
+                "options": tuple(text(first + j) for j in range(n_options)),
+                "answer": answer,
+                "exp": text(explanation),
+            }
+            table.append(_compile_template(DOMAINS[d], raw))
+        self.templates = tuple(table)
+        self._domains = tuple(DOMAINS.index(t.domain) for t in table)
+
+        self.template_index = view[records_at:records_at + 2 * count].cast("H")
+        self.var_code = view[records_at + 2 * count:records_at + 4 * count].cast("H")
+        self.number = view[records_at + 4 * count:records_at + 8 * count].cast("I")
+        offsets.release()
+        blob.release()
+        view.release()
+
+    def __len__(self):
+        return len(self.number)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        t = self.template_index[i]
+        return _BoundQuestion(self._domains[t], t, self.number[i], self.var_code[i], self.templates)
+
+    def close(self):
+        for column in (self.template_index, self.var_code, self.number):
+            column.release()
+        self._mmap.close()
 
-    # Distribution similar to PMP ECO weighting
-    n_process = int(total * 0.50)
-    n_people = int(total * 0.40)
-    n_business = total - n_process - n_people  # remainder ~10%
 
-    questions = []
-    questions += _generate_process(n_process, rng)
-    questions += _generate_people(n_people, rng)
-    questions += _generate_business(n_business, rng)
+# -----------------------------
+# Importing question banks
+# -----------------------------
+# Bump when parsing or validation changes so cached imports are rebuilt.
+_IMPORT_VERSION = 1
+_IMPORT_FIELDS = ("id", "domain", "topic", "question", "options", "answer_index", "explanation")
+_IMPORT_LIMIT = 0xFFFF  # rows per file: bank files index templates with uint16
 
-    # Shuffle the final bank for randomness (still deterministic per seed)
-    rng.shuffle(questions)
-    return questions
 
+class RowError(NamedTuple):
+    line: int  # 1-based line (JSONL) or record line (CSV) in the source file
+    message: str
 
-def _generate_process(n: int, rng: random.Random):
-    templates = []
 
-    templates.append({
+def import_bank(path, cache_dir=None):
+    """
+    Imports questions from a JSONL or CSV file as an ImportedBank.
+
+    Each row must have the fields of generate_question_bank: id, domain,
+    topic, question, options, answer_index, explanation. In CSV, options is
+    a JSON array or a "|"-separated list. The file is parsed one row at a
+    time; rows that fail validation, including rows that are not valid
+    UTF-8, are skipped and listed in bank.errors. Files with more than
+    65,535 rows are rejected with ValueError before any row is parsed.
+
+    The parsed bank is cached in cache_dir (default ~/.cache/pmpexam) as a
+    bank file named by the SHA-256 of the file content, so importing the
+    same content again only maps the cached file.
+    """
+    path = os.fspath(path)
+    digest = hashlib.sha256(_IMPORT_VERSION.to_bytes(4, "little"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pmpexam")
+    cached = os.path.join(cache_dir, digest.hexdigest()[:32])
+
+    with METRICS.timer("import_bank"):
+        try:
+            with open(f"{cached}.json") as f:
+                meta = json.load(f)
+            bank = ImportedBank(f"{cached}.pmpbank", meta["ids"], [RowError(*e) for e in meta["errors"]])
+            METRICS.inc("import_cache_hits")
+            return bank
+        except (OSError, ValueError, KeyError):
+            pass  # not cached yet, or a stale or partial entry
+
+        questions, errors = _parse_import(path)
+        if not questions:
+            first = f" (line {errors[0].line}: {errors[0].message})" if errors else ""
+            raise ValueError(f"{path}: no valid questions{first}")
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write-then-rename both files, bank file last: a reader that finds
+        # the bank file also finds its ids.
+        tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": os.path.basename(path), "ids": [q.id for q in questions], "errors": errors}, f)
+        os.replace(tmp, f"{cached}.json")
+        save_bank(questions, tmp)
+        os.replace(tmp, f"{cached}.pmpbank")
+        METRICS.inc("import_cache_misses")
+    return ImportedBank(f"{cached}.pmpbank", [q.id for q in questions], errors)
+
+
+def _parse_import(path):
+    # -> (list of _ImportedQuestion, list of RowError), reading one row at a time
+    rows = sum(1 for _ in _import_rows(path))
+    if rows > _IMPORT_LIMIT:
+        raise ValueError(f"{path}: {rows:,} rows; an import holds at most {_IMPORT_LIMIT:,} questions")
+
+    questions, errors, seen, templates = [], [], set(), {}
+    for line, row in _import_rows(path):
+        try:
+            if isinstance(row, bytes):
+                try:
+                    row = json.loads(row.decode("utf-8-sig"))
+                except UnicodeDecodeError:
+                    raise ValueError("not valid UTF-8") from None
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"invalid JSON: {e.msg}") from None
+            else:
+                _check_utf8(row)
+            qid, template = _import_row(row)
+            if qid in seen:
+                raise ValueError(f"duplicate id {qid!r}")
+        except ValueError as e:
+            errors.append(RowError(line, str(e)))
+            continue
+        template = templates.setdefault(template, template)
+        seen.add(qid)
+        questions.append(_ImportedQuestion(DOMAINS.index(template.domain), 0, len(questions), 0, (template,), qid))
+    return questions, errors
+
+
+def _import_rows(path):
+    # Yields (line, raw line bytes) for JSONL or (line, dict) for CSV. CSV
+    # bytes are decoded with surrogateescape so a bad byte spoils only its
+    # own record; _check_utf8 turns it into that row's error.
+    with open(path, "rb") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(codecs.iterdecode(f, "utf-8-sig", errors="surrogateescape"))
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, raw in enumerate(f, 1):
+                if raw.strip():
+                    yield line, raw
+
+
+def _check_utf8(row):
+    # Raises ValueError if a CSV cell holds bytes that were not valid UTF-8.
+    for value in row.values():
+        for cell in value if isinstance(value, list) else (value,):
+            if isinstance(cell, str) and not cell.isascii():
+                try:
+                    cell.encode("utf-8")
+                except UnicodeEncodeError:
+                    raise ValueError("not valid UTF-8") from None
+
+
+def _import_row(row):
+    # Validates one parsed row against the generate_question_bank schema.
+    # -> (id, Template) or ValueError naming the first bad field.
+    if not isinstance(row, dict):
+        raise ValueError("expected an object with the question fields")
+    missing = [field for field in _IMPORT_FIELDS if row.get(field) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    for field in ("id", "domain", "topic", "question", "explanation"):
+        if not isinstance(row[field], str):
+            raise ValueError(f"{field} must be a string")
+    qid, topic, text = row["id"].strip(), row["topic"].strip(), row["question"].strip()
+    if not qid or not topic or not text:
+        raise ValueError("id, topic and question must not be empty")
+    if row["domain"] not in DOMAINS:
+        raise ValueError(f"unknown domain {row['domain']!r}")
+
+    options = row["options"]
+    if isinstance(options, str):  # CSV cell
+        try:
+            options = json.loads(options) if options.lstrip().startswith("[") else options.split("|")
+        except json.JSONDecodeError:
+            raise ValueError("options is not a valid JSON array") from None
+    if not isinstance(options, list) or not all(isinstance(o, str) and o.strip() for o in options):
+        raise ValueError("options must be a list of non-empty strings")
+    options = [o.strip() for o in options]
+    if not 2 <= len(options) <= 255:
+        raise ValueError("need between 2 and 255 options")
+
+    answer = row["answer_index"]
+    if isinstance(answer, str) and answer.strip().lstrip("-").isdigit():
+        answer = int(answer)
+    if isinstance(answer, bool) or not isinstance(answer, int):
+        raise ValueError("answer_index must be an integer")
+    raw = {
+        "topic": topic,
+        "q": text.replace("{", "{{").replace("}", "}}"),  # imported text has no placeholders
+        "options": options,
+        "answer": answer,
+        "exp": row["explanation"].strip(),
+    }
+    return qid, _compile_template(row["domain"], raw)
+
+
+class _ImportedQuestion(_BoundQuestion):
+    # Question that keeps the id it was imported with.
+    __slots__ = ("external_id",)
+
+    def __init__(self, domain_index: int, template_index: int, number: int, var_code: int, table, external_id: str):
+        super().__init__(domain_index, template_index, number, var_code, table)
+        self.external_id = external_id
+
+    @property
+    def id(self):
+        return self.external_id
+
+
+class ImportedBank(MappedBank):
+    """
+    MappedBank of imported questions (see import_bank). Questions keep the ids
+    from the source file; rows skipped by validation are in errors.
+    """
+
+    def __init__(self, path, ids, errors=()):
+        super().__init__(path)
+        if len(ids) != len(self):
+            raise ValueError(f"{path}: ids do not match the bank")
+        self.ids = ids
+        self.errors = list(errors)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        t = self.template_index[i]
+        return _ImportedQuestion(self._domains[t], t, self.number[i], self.var_code[i], self.templates, self.ids[i])
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+# Upper bounds, in seconds, of the span duration histogram buckets
+_METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_metrics_log = logging.getLogger("pmpexam.metrics")
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Duration histograms of named code paths (spans) and event counters.
+
+    Off by default: timer() then returns one shared no-op context manager and
+    inc() returns at once, so instrumented code pays about one attribute
+    check. Every finished span is also logged as a JSON line on the
+    "pmpexam.metrics" logger, at WARNING when it took slow_seconds or more
+    and at DEBUG otherwise.
+    """
+
+    def __init__(self, enabled: bool = False, slow_seconds: float = 0.5):
+        self.enabled = enabled
+        self.slow_seconds = slow_seconds
+        self._spans = {}  # name -> [count, total seconds, per-bucket counts...]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name: str):
+        """
+        Context manager timing one run of the `name` span.
+        """
+        return _Span(self, name) if self.enabled else _NO_SPAN
+
+    def timed(self, name: str):
+        """
+        Decorator timing every call of a function as the `name` span.
+        """
+
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def inc(self, name: str, n: int = 1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                span = self._spans[name] = [0, 0.0] + [0] * len(_METRIC_BUCKETS)
+            span[0] += 1
+            span[1] += seconds
+            bucket = bisect.bisect_left(_METRIC_BUCKETS, seconds)
+            if bucket < len(_METRIC_BUCKETS):
+                span[2 + bucket] += 1
+        slow = seconds >= self.slow_seconds
+        level = logging.WARNING if slow else logging.DEBUG
+        if _metrics_log.isEnabledFor(level):
+            _metrics_log.log(level, json.dumps({
+                "ts": round(time.time(), 3),
+                "span": name,
+                "seconds": round(seconds, 6),
+                "slow": slow,
+                "thread": threading.current_thread().name,
+            }))
+
+    def snapshot(self):
+        """
+        Returns every span and counter as plain JSON-serialisable data.
+        Bucket counts are cumulative, keyed by upper bound as in Prometheus.
+        """
+        with self._lock:
+            spans = {name: list(span) for name, span in self._spans.items()}
+            counters = dict(self._counters)
+        out = {}
+        for name, (count, total, *buckets) in sorted(spans.items()):
+            cumulative, running = {}, 0
+            for bound, n in zip(_METRIC_BUCKETS, buckets):
+                running += n
+                cumulative[f"{bound:g}"] = running
+            cumulative["+Inf"] = count
+            out[name] = {"count": count, "sum": total, "buckets": cumulative}
+        return {"spans": out, "counters": dict(sorted(counters.items()))}
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        snap = self.snapshot()
+        lines = [
+            "# HELP pmp_span_seconds Time spent in instrumented code paths.",
+            "# TYPE pmp_span_seconds histogram",
+        ]
+        for name, span in snap["spans"].items():
+            for bound, n in span["buckets"].items():
+                lines.append(f'pmp_span_seconds_bucket{{span="{name}",le="{bound}"}} {n}')
+            lines.append(f'pmp_span_seconds_sum{{span="{name}"}} {span["sum"]:.6f}')
+            lines.append(f'pmp_span_seconds_count{{span="{name}"}} {span["count"]}')
+        lines += ["# HELP pmp_events_total Counted events.", "# TYPE pmp_events_total counter"]
+        for name, n in snap["counters"].items():
+            lines.append(f'pmp_events_total{{event="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Write-then-rename, so a scraper (e.g. node_exporter's textfile
+        # collector) never reads a half-written file.
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def export_file(self, path, interval: float = 15.0):
+        """
+        Rewrites `path` with the Prometheus text every `interval` seconds
+        from a daemon thread.
+        """
+
+        def loop():
+            while True:
+                self.write_prometheus(path)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name="pmp-metrics-file", daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serves /metrics (Prometheus text) and /metrics.json from a daemon
+        thread. Returns the server; call shutdown() on it to stop.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="pmp-metrics-http", daemon=True).start()
+        return server
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Process-wide registry used by the bank functions and the app
+METRICS = Metrics()
+
+
+# -----------------------------
+# Templates (shared by every bank)
+# -----------------------------
+_PROCESS_TEMPLATES = (
+    {
         "topic": "Integration / Change control",
         "q": "{name} is managing a {approach} project in {industry}. A stakeholder requests {size} change during {phase} and asks to bypass the agreed change process. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Approve the change to maintain stakeholder engagement",
             "Assess impacts and follow the agreed change control/governance approach",
             "Escalate to the sponsor immediately",
             "Update the schedule baseline and implement the change",
-        ],
+        ),
         "answer": 1,
-        "exp": "PMP expects: assess impact → follow governance/change approach. Escalation is not first unless required by policy or repeated noncompliance."
-    })
-
-    templates.append({
+        "exp": "PMP expects: assess impact → follow governance/change approach. Escalation is not first unless required by policy or repeated noncompliance.",
+    },
+    {
         "topic": "Scope / Requirements",
         "q": "Deliverables are being produced, but key stakeholders say they do not meet expectations. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Conduct a quality audit to identify nonconformities",
             "Review and confirm requirements and acceptance criteria with stakeholders",
             "Add additional testers to the team",
             "Escalate to the steering committee",
-        ],
+        ),
         "answer": 1,
-        "exp": "If stakeholders reject deliverables, first verify requirements and acceptance criteria (definition of done). Audits/resourcing come after confirming what's expected."
-    })
-
-    templates.append({
+        "exp": "If stakeholders reject deliverables, first verify requirements and acceptance criteria (definition of done). Audits/resourcing come after confirming what's expected.",
+    },
+    {
         "topic": "Quality",
         "q": "The team finds the same defect pattern repeatedly even though inspections occur regularly. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Increase inspection frequency",
             "Perform root cause analysis and implement preventive actions",
             "Ask the customer to accept the defects due to schedule pressure",
             "Replace the quality inspector",
-        ],
+        ),
         "answer": 1,
-        "exp": "Repeated defects indicate a systemic cause. PMP favors prevention over inspection: root cause analysis (5 Whys, fishbone) → preventive actions."
-    })
-
-    templates.append({
+        "exp": "Repeated defects indicate a systemic cause. PMP favors prevention over inspection: root cause analysis (5 Whys, fishbone) → preventive actions.",
+    },
+    {
         "topic": "Schedule / Forecasting",
         "q": "A key milestone is at risk because remaining work was underestimated. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Require overtime to recover the schedule",
             "Re-estimate remaining work and update the schedule forecast",
             "Rebaseline the schedule immediately",
             "Remove low performers from the team",
-        ],
+        ),
         "answer": 1,
-        "exp": "First get accurate data and update the forecast. Rebaselining is a formal decision after analysis and approvals; overtime is an option after planning."
-    })
-
-    templates.append({
+        "exp": "First get accurate data and update the forecast. Rebaselining is a formal decision after analysis and approvals; overtime is an option after planning.",
+    },
+    {
         "topic": "Risk vs Issue",
         "q": "A supplier missed two deliveries and work is now blocked. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Log it as a risk and monitor",
             "Record it as an issue and implement the issue response/escalation path",
             "Ignore it until the next status meeting",
             "Only update the lessons learned register",
-        ],
+        ),
         "answer": 1,
-        "exp": "A current blocking problem is an issue (not a risk). Capture it in the issue log and execute the agreed issue management/escalation process."
-    })
-
-    templates.append({
+        "exp": "A current blocking problem is an issue (not a risk). Capture it in the issue log and execute the agreed issue management/escalation process.",
+    },
+    {
         "topic": "Communications Planning",
         "q": "Stakeholders complain that updates are inconsistent and they do not know what decisions were made. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Send daily status reports to all stakeholders",
             "Review communication requirements and update the communications management plan",
             "Escalate to the sponsor",
             "Replace the communications tool",
-        ],
+        ),
         "answer": 1,
-        "exp": "Plan communications based on stakeholder needs: what info, when, how, by whom. 'More reports' is a trap if requirements are unclear."
-    })
-
-    templates.append({
+        "exp": "Plan communications based on stakeholder needs: what info, when, how, by whom. 'More reports' is a trap if requirements are unclear.",
+    },
+    {
         "topic": "Procurement",
         "q": "A vendor proposes a substitute that meets technical specs but changes contract terms. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Accept the substitute to avoid delays",
             "Review the contract and follow the procurement/change control process",
             "Ask the team to decide and proceed immediately",
             "Pay extra to keep the schedule",
-        ],
+        ),
         "answer": 1,
-        "exp": "Contract changes must follow contractual and integrated change control. Review terms, approvals, and impacts before accepting substitutions."
-    })
-
-    templates.append({
+        "exp": "Contract changes must follow contractual and integrated change control. Review terms, approvals, and impacts before accepting substitutions.",
+    },
+    {
         "topic": "Agile/Hybrid Value Delivery",
         "q": "In a(n) {approach} project, during {phase} a stakeholder says a delivered feature does not provide expected value. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Submit a formal change request",
             "Facilitate backlog refinement and ask the product owner to reprioritize",
             "Reject the feedback because the iteration is complete",
             "Update the scope baseline",
-        ],
+        ),
         "answer": 1,
-        "exp": "Agile/hybrid exams prefer adapting through backlog refinement and reprioritization to maximize value. Formal change requests apply if governance requires it."
-    })
-
-    templates.append({
+        "exp": "Agile/hybrid exams prefer adapting through backlog refinement and reprioritization to maximize value. Formal change requests apply if governance requires it.",
+    },
+    {
         "topic": "Cost / Variance",
         "q": "Performance reports show cost variance is worsening. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Reduce quality activities to save money",
             "Analyze variance causes and develop corrective actions",
             "Replace the cost engineer",
             "Stop reporting cost performance to avoid escalation",
-        ],
+        ),
         "answer": 1,
-        "exp": "First analyze causes of variance and plan corrective actions. Cutting quality is a classic PMP trap; personnel changes are rarely the first response."
-    })
-
-    templates.append({
+        "exp": "First analyze causes of variance and plan corrective actions. Cutting quality is a classic PMP trap; personnel changes are rarely the first response.",
+    },
+    {
         "topic": "Governance / Compliance",
         "q": "Midway through the project, the organization introduces a new governance/compliance requirement. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Stop the project immediately",
             "Assess impacts and determine required updates to plans and baselines",
             "Ignore until project closing",
             "Ask the team to work around it informally",
-        ],
+        ),
         "answer": 1,
-        "exp": "New governance/compliance constraints require impact assessment first, then updates through the agreed governance/change process."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        v = _vars(rng)
-        out.append({
-            "id": f"P{i+1:03d}",
-            "domain": "Process",
-            "topic": t["topic"],
-            "question": t["q"].format(**v),
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
-
-
-def _generate_people(n: int, rng: random.Random):
-    templates = []
+        "exp": "New governance/compliance constraints require impact assessment first, then updates through the agreed governance/change process.",
+    },
+)
 
-    templates.append({
+_PEOPLE_TEMPLATES = (
+    {
         "topic": "Conflict Management",
-        "q": "Two team members strongly disagree on a technical approach and the conflict is hurting team morale. What should the project manager do FIRST?",
-        "options": [
+        "q": "Two team members on a {approach} project in {industry} strongly disagree on a technical approach and the conflict is hurting team morale. What should the project manager do FIRST?",
+        "options": (
             "Use authority to pick the solution",
             "Facilitate a collaborative discussion to understand interests and reach agreement",
             "Escalate to functional management",
             "Remove one team member from the project",
-        ],
+        ),
         "answer": 1,
-        "exp": "PMP prefers collaborate/problem-solve first. Forcing or escalation is used only when collaboration fails or time/safety constraints demand it."
-    })
-
-    templates.append({
+        "exp": "PMP prefers collaborate/problem-solve first. Forcing or escalation is used only when collaboration fails or time/safety constraints demand it.",
+    },
+    {
         "topic": "Servant Leadership",
         "q": "A high-performing, self-organizing team says the project manager’s frequent oversight is slowing them down. What should the project manager do?",
-        "options": [
+        "options": (
             "Increase monitoring to ensure standards are met",
             "Adopt servant leadership: empower the team and provide support as needed",
             "Replace team members who resist oversight",
             "Escalate the complaint to HR",
-        ],
+        ),
         "answer": 1,
-        "exp": "For mature teams, empower and remove impediments. Over-control reduces ownership and performance—an exam-favorite trap."
-    })
-
-    templates.append({
+        "exp": "For mature teams, empower and remove impediments. Over-control reduces ownership and performance—an exam-favorite trap.",
+    },
+    {
         "topic": "Stakeholder Engagement",
         "q": "A key stakeholder actively resists the project because they fear the change will reduce their influence. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Escalate to the sponsor to overrule the stakeholder",
             "Understand concerns and work with the stakeholder on engagement and change readiness",
             "Ignore the stakeholder and proceed as planned",
             "Remove the stakeholder from communications and decisions",
-        ],
+        ),
         "answer": 1,
-        "exp": "Resistance is addressed through engagement: understand concerns, communicate value, involve stakeholders. Escalate only after collaboration attempts."
-    })
-
-    templates.append({
+        "exp": "Resistance is addressed through engagement: understand concerns, communicate value, involve stakeholders. Escalate only after collaboration attempts.",
+    },
+    {
         "topic": "Team Development",
         "q": "New team members joined and roles/responsibilities are unclear. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Assign tasks ad hoc and adjust later",
             "Develop/revisit the team charter and clarify roles (e.g., RACI, working agreements)",
             "Wait for the team to self-organize over time",
             "Escalate to the sponsor for direction",
-        ],
+        ),
         "answer": 1,
-        "exp": "Clarify roles and working agreements early. Team charters and RACI-style clarity are common PMP correct answers."
-    })
-
-    templates.append({
+        "exp": "Clarify roles and working agreements early. Team charters and RACI-style clarity are common PMP correct answers.",
+    },
+    {
         "topic": "Communication & Culture",
         "q": "A distributed team reports misunderstandings due to cultural and language differences. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Use only written communication to avoid confusion",
             "Tailor communications and establish shared norms, using interactive methods for complex topics",
             "Replace remote members with local staff",
             "Stop meetings to reduce conflict",
-        ],
+        ),
         "answer": 1,
-        "exp": "Tailor communication, use cultural awareness, and use interactive methods for complex/sensitive topics. Replacing people is rarely first."
-    })
-
-    templates.append({
+        "exp": "Tailor communication, use cultural awareness, and use interactive methods for complex/sensitive topics. Replacing people is rarely first.",
+    },
+    {
         "topic": "Coaching & Performance",
         "q": "A team member is underperforming because expectations were not clearly communicated. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Document the issue and escalate to HR",
             "Clarify expectations, provide feedback, and coach the team member",
             "Remove the team member from the project immediately",
             "Ignore it to avoid conflict",
-        ],
+        ),
         "answer": 1,
-        "exp": "PMP prefers direct coaching and clear expectations first. Escalation/removal is later if performance does not improve."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        out.append({
-            "id": f"PE{i+1:03d}",
-            "domain": "People",
-            "topic": t["topic"],
-            "question": t["q"],
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
+        "exp": "PMP prefers direct coaching and clear expectations first. Escalation/removal is later if performance does not improve.",
+    },
+)
 
-
-def _generate_business(n: int, rng: random.Random):
-    templates = []
-
-    templates.append({
+_BUSINESS_TEMPLATES = (
+    {
         "topic": "Compliance / Regulatory",
-        "q": "Mid-project, a new regulatory requirement is announced that may affect the product design. What should the project manager do FIRST?",
-        "options": [
+        "q": "Mid-project, a new {industry} regulatory requirement is announced that may affect the product design. What should the project manager do FIRST?",
+        "options": (
             "Ignore it until the next phase to avoid delays",
             "Assess the impact and determine required changes to remain compliant",
             "Ask the team to implement changes immediately without analysis",
             "Close the project early",
-        ],
+        ),
         "answer": 1,
-        "exp": "Compliance is non-negotiable. First assess impacts, then follow governance/change control to implement required changes."
-    })
-
-    templates.append({
+        "exp": "Compliance is non-negotiable. First assess impacts, then follow governance/change control to implement required changes.",
+    },
+    {
         "topic": "Business Value / Benefits",
         "q": "Deliverables are being completed on schedule, but expected business benefits are not being realized. What should the project manager do NEXT?",
-        "options": [
+        "options": (
             "Continue focusing only on completing deliverables",
             "Review the benefits management plan and engage stakeholders to realign to outcomes",
             "Increase reporting frequency",
             "Reduce scope to finish earlier",
-        ],
+        ),
         "answer": 1,
-        "exp": "PMP emphasizes value delivery: verify benefits realization and realign via governance. Outputs ≠ outcomes is a core exam theme."
-    })
-
-    templates.append({
+        "exp": "PMP emphasizes value delivery: verify benefits realization and realign via governance. Outputs ≠ outcomes is a core exam theme.",
+    },
+    {
         "topic": "Strategy Alignment",
         "q": "A project supports a strategic objective, but market conditions changed and the objective may no longer be valid. What should the project manager do FIRST?",
-        "options": [
+        "options": (
             "Hide the information to prevent cancellation",
             "Raise the concern through governance and request a business case/strategy review",
             "Push the team to deliver faster to prove value",
             "Reduce quality to meet deadlines",
-        ],
+        ),
         "answer": 1,
-        "exp": "When strategy shifts, the PM should surface it through governance so leadership can decide to continue, pivot, pause, or terminate."
-    })
-
-    templates.append({
+        "exp": "When strategy shifts, the PM should surface it through governance so leadership can decide to continue, pivot, pause, or terminate.",
+    },
+    {
         "topic": "Governance / Policy",
-        "q": "The sponsor requests a feature that conflicts with an organizational policy. What should the project manager do?",
-        "options": [
+        "q": "During {phase}, the sponsor requests a feature that conflicts with an organizational policy. What should the project manager do?",
+        "options": (
             "Implement the feature because the sponsor requested it",
             "Explain the constraint, assess options, and follow governance for a compliant decision",
             "Ask the team to implement it quietly",
             "Remove the policy from project documentation",
-        ],
+        ),
         "answer": 1,
-        "exp": "Policy/compliance constraints must be respected. Communicate constraints, assess alternatives, and use governance for approvals."
-    })
-
-    out = []
-    for i in range(n):
-        t = rng.choice(templates)
-        out.append({
-            "id": f"B{i+1:03d}",
-            "domain": "Business Environment",
-            "topic": t["topic"],
-            "question": t["q"],
-            "options": t["options"],
-            "answer_index": t["answer"],
-            "explanation": t["exp"],
-        })
-    return out
+        "exp": "Policy/compliance constraints must be respected. Communicate constraints, assess alternatives, and use governance for approvals.",
+    },
+)
+
+# Template registry: compiled and validated once at import, shared by every bank
+_DOMAIN_TEMPLATES = tuple(
+    tuple(_compile_template(domain, raw) for raw in templates)
+    for domain, templates in zip(DOMAINS, (_PROCESS_TEMPLATES, _PEOPLE_TEMPLATES, _BUSINESS_TEMPLATES))
+)
+TEMPLATES = dict(zip(DOMAINS, _DOMAIN_TEMPLATES))
+_ID_PREFIXES = ("P", "PE", "B")
+
+# domain -> topic -> template indices, built once at import
+TOPIC_INDEX = {
+    domain: {
+        topic: tuple(i for i, t in enumerate(templates) if t.topic == topic)
+        for topic in dict.fromkeys(t.topic for t in templates)
+    }
+    for domain, templates in TEMPLATES.items()
+}
+_ALL_TOPICS = frozenset(topic for topics in TOPIC_INDEX.values() for topic in topics)
+_TEMPLATE_KEYS = {t: i for templates in _DOMAIN_TEMPLATES for i, t in enumerate(templates)}
+_FULL_PLAN = tuple((d, tuple(range(len(templates)))) for d, templates in enumerate(_DOMAIN_TEMPLATES))
+
+# Hash streams: 0-2 for question content per domain, 3 for bank order,
+# 4 for sampling from an existing bank, 5 for unique-mode permutations,
+# 6 for the order of unseen questions in review mode, 7 for exam forms,
+# 8 for which topics get the remainder seats of a quota.
+_ORDER_STREAM = 3
+_SAMPLE_STREAM = 4
+_UNIQUE_STREAM = 5
+_REVIEW_STREAM = 6
+_FORMS_STREAM = 7
+_QUOTA_STREAM = 8
+
+
+def _make_question(d: int, seed: int, number: int, templates, count: int):
+    # Numbers 1..count of a domain are split over its topics by exact quota
+    # (see _topic_split); within its topic every question draws a template
+    # and a packed set of scenario variables.
+    ends, groups = _topic_split(d, templates, count, seed)
+    group = groups[bisect.bisect_left(ends, number)]
+    rest, t = divmod(_item_hash(seed, d, number), len(group))
+    return Question(d, group[t], number, rest % _VAR_COMBOS)
+
+
+@functools.lru_cache(maxsize=1024)
+def _topic_split(d: int, templates, count: int, seed: int):
+    # Per topic (sorted, as in BankStrata) its allowed templates and its share
+    # of count, in proportion to its template count; the seed picks which
+    # topics get the remainder seats (see _apportion). Returns (cumulative share ends, per topic its template indices).
+    groups = {}
+    for t in templates:
+        groups.setdefault(_DOMAIN_TEMPLATES[d][t].topic, []).append(t)
+    groups = tuple(tuple(groups[topic]) for topic in sorted(groups))
+    shares = _apportion(count, [len(group) for group in groups], [count] * len(groups), _item_hash(seed, _QUOTA_STREAM, d))
+    return tuple(itertools.accumulate(shares)), groups
+
+
+@functools.lru_cache(maxsize=None)
+def _unique_space(d: int, templates):
+    # Ranks 0..capacity-1 enumerate the distinct questions of a domain's
+    # allowed templates, template by template. Only the variables a template
+    # uses count towards its combinations. Returns (cumulative rank ends,
+    # per template the (stride, pool size) of each variable it uses).
+    ends, radices, end = [], [], 0
+    for t in templates:
+        radices.append(_used_radices(_DOMAIN_TEMPLATES[d][t].slots))
+        end += math.prod(size for _, size in radices[-1])
+        ends.append(end)
+    return tuple(ends), tuple(radices)
+
+
+@functools.lru_cache(maxsize=None)
+def _used_radices(slots):
+    # (stride, pool size) of each scenario variable a template's slots use
+    return tuple((_VAR_STRIDES[k], len(_VAR_POOLS[k][1])) for k in dict.fromkeys(slots))
+
+
+def _used_code(radices, var_code: int):
+    # var_code with the variables a template does not use zeroed: questions of
+    # one template render the same text exactly when their used codes match.
+    return sum(var_code // stride % size * stride for stride, size in radices)
+
+
+def _make_unique_question(d: int, seed: int, number: int, templates):
+    # Unranks item `number` of a seeded permutation of the domain's space:
+    # distinct numbers give distinct questions, with no rejection sampling.
+    ends, radices = _unique_space(d, templates)
+    rank = _permute(number - 1, ends[-1], _item_hash(seed, _UNIQUE_STREAM, d))
+    t = bisect.bisect_right(ends, rank)
+    rest = rank - (ends[t - 1] if t else 0)
+    var_code = 0
+    for stride, size in radices[t]:
+        rest, digit = divmod(rest, size)
+        var_code += digit * stride
+    return Question(d, templates[t], number, var_code)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Question bank tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a generated bank to a memory-mappable bank file")
+    export.add_argument("path")
+    export.add_argument("--total", type=int, default=200)
+    export.add_argument("--seed", type=int, default=7)
+    export.add_argument("--backend", choices=["python", "numpy"], default="python")
+    export.add_argument("--workers", type=int, default=1)
+    load = commands.add_parser("import", help="validate and cache a JSONL or CSV question file")
+    load.add_argument("path")
+    load.add_argument("--cache-dir")
+    assemble = commands.add_parser("forms", help="assemble equivalent exam forms from a bank file or question file")
+    assemble.add_argument("path")
+    assemble.add_argument("--forms", type=int, default=2)
+    assemble.add_argument("--questions", type=int, default=180)
+    assemble.add_argument("--seed", type=int, default=7)
+    assemble.add_argument("--difficulty", help="JSON file of {question id: proportion correct}")
+    assemble.add_argument("--candidates", type=int, default=4)
+    assemble.add_argument("--workers", type=int, default=1)
+    assemble.add_argument("--out", help="write forms and report as JSON (default: print the report)")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        bank = import_bank(args.path, cache_dir=args.cache_dir)
+        for error in bank.errors:
+            print(f"{args.path}:{error.line}: {error.message}", file=sys.stderr)
+        print(f"imported {len(bank):,} questions, skipped {len(bank.errors):,} rows")
+    if args.command == "forms":
+        bank = import_bank(args.path) if args.path.lower().endswith((".jsonl", ".csv")) else load_bank(args.path)
+        difficulty = None
+        if args.difficulty:
+            with open(args.difficulty) as f:
+                difficulty = json.load(f)
+        result = assemble_forms(
+            bank, args.forms, args.questions, seed=args.seed, difficulty=difficulty,
+            candidates=args.candidates, workers=args.workers,
+        )
+        report = result.report._replace(blueprint={f"{d} / {t}": n for (d, t), n in result.report.blueprint.items()})
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"report": report._asdict(), "forms": [[bank[p].id for p in form] for form in result.forms]}, f, indent=1)
+        for field, value in report._asdict().items():
+            if field != "blueprint":
+                print(f"{field:<20} {value}")
+    if args.command == "export":
+        bank = generate_compact_bank(total=args.total, seed=args.seed, backend=args.backend, workers=args.workers)
+        save_bank(bank, args.path)
+        print(f"wrote {len(bank):,} questions to {args.path}")
@@ -0,0 +1,373 @@
+"""
+Concurrent-session load test for the Streamlit app in pmpexamapp.py.py.
+
+Every simulated candidate starts a quiz, answers or skips each question,
+sometimes steps back, and finishes on the results review, pausing for a
+log-normal think time between actions. Runs fully offline.
+
+Run from the repository root:
+    python pmpload.py --sessions 1 2 4 8              # AppTest sessions in this process
+    python pmpload.py --server --sessions 1 8 32 64   # local `streamlit run` over websockets
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+APP = Path(__file__).with_name("pmpexamapp.py.py")
+# Simulated candidates must not land in the learners' attempt history.
+APP_ENV = {"PMP_ATTEMPTS_DB": ""}
+
+
+def scenario(rng: random.Random, questions: int, skip_rate: float = 0.15, back_rate: float = 0.10):
+    """
+    Yields (action, option) pairs for one candidate. The last "next" leaves
+    the final question and is reported as "review", since it renders the
+    results screen.
+    """
+    yield "start", None
+    for i in range(questions):
+        option = rng.randrange(4)
+        if rng.random() < skip_rate:
+            yield "skip", option
+        else:
+            yield "select", option
+            yield "confirm", option
+        if 0 < i < questions - 1 and rng.random() < back_rate:
+            yield "previous", None
+            yield "next", None
+        yield ("review" if i == questions - 1 else "next"), None
+
+
+def think_time(rng: random.Random, median: float, sigma: float = 0.6):
+    # Log-normal: most pauses are near the median, a few are much longer.
+    return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+def rss(pid="self"):
+    """
+    Resident set size of a process in bytes, or None where /proc is missing.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+# -----------------------------
+# AppTest sessions (in-process)
+# -----------------------------
+class AppTestSession:
+    """
+    One candidate driving its own AppTest instance of the app.
+    AppTest swaps a process-wide runtime in and out around every run, so
+    reruns from different sessions cannot overlap. They queue on a lock, and
+    the reported latency includes that wait, as a candidate would see it.
+    """
+
+    _run_lock = threading.Lock()
+
+    def __init__(self, seed: int, questions: int):
+        from streamlit.testing.v1 import AppTest
+
+        os.environ.update(APP_ENV)  # AppTest runs the app in this process
+        self.at = AppTest.from_file(str(APP), default_timeout=120)
+        self.seed = seed
+        self.questions = questions
+
+    def _button(self, label: str):
+        return next(b for b in self.at.button if label in b.label)
+
+    def run(self, action: str, option=None):
+        """
+        Applies one action and returns the rerun time in seconds.
+        """
+        at = self.at
+        if action == "open":
+            pass
+        elif action == "start":
+            at.number_input[0].set_value(self.seed)
+            at.slider[0].set_value(self.questions)
+            self._button("Start").click()
+        elif action == "select":
+            at.radio[0].set_value(option)
+        elif action == "confirm":
+            self._button("Confirm").click()
+        elif action == "skip":
+            self._button("Skip").click()
+        elif action == "previous":
+            self._button("Previous").click()
+        else:
+            self._button("Next").click()
+        start = time.perf_counter()
+        with self._run_lock:
+            at.run()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"app raised during {action!r}: {at.exception[0].message}")
+        return elapsed
+
+
+def run_apptest(sessions: int, questions: int, think: float, seed: int):
+    """
+    Drives `sessions` AppTest candidates from threads and returns
+    (latencies by action, wall seconds, RSS growth in bytes or None).
+    """
+    before = rss()
+    latencies = {}
+    lock = threading.Lock()
+    errors = []
+    candidates = [AppTestSession(seed + n, questions) for n in range(sessions)]
+
+    def candidate(n: int):
+        rng = random.Random(seed * 1_000_003 + n)
+        session = candidates[n]
+        try:
+            session.run("open")
+            time.sleep(rng.uniform(0, think))  # staggered arrivals
+            for action, option in scenario(rng, questions):
+                elapsed = session.run(action, option)
+                with lock:
+                    latencies.setdefault(action, []).append(elapsed)
+                time.sleep(think_time(rng, think))
+        except Exception as exc:
+            errors.append(exc)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=candidate, args=(n,)) for n in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    after = rss()
+    return latencies, wall, None if before is None or after is None else after - before
+
+
+# -----------------------------
+# Local server sessions (websockets)
+# -----------------------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch_server(port: int):
+    """
+    Starts `streamlit run` on the app, bound to localhost, and waits for it.
+    """
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", str(APP),
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+            "--server.fileWatcherType", "none",
+            "--server.enableXsrfProtection", "false",
+            "--browser.gatherUsageStats", "false",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, **APP_ENV},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("streamlit server did not start")
+
+
+class ServerSession:
+    """
+    One candidate speaking the browser's websocket protocol to a local server.
+    Widgets are found by label from the deltas of the previous rerun.
+    """
+
+    def __init__(self, port: int, seed: int, questions: int):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.seed = seed
+        self.questions = questions
+        self.widgets = {}  # label -> (element type, widget id, fragment id)
+        self.states = {}  # widget id -> (value field, value)
+        self.radio_options = []
+
+    async def connect(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url, max_size=None)
+
+    async def close(self):
+        await self.ws.close()
+
+    def _widget(self, label: str):
+        return next(w for text, w in self.widgets.items() if label in text)
+
+    async def _rerun(self, trigger=None, fragment_id: str = ""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        rerun = msg.rerun_script
+        rerun.fragment_id = fragment_id
+        for wid, (field, value) in self.states.items():
+            state = rerun.widget_states.widgets.add()
+            state.id = wid
+            if field == "double_array_value":
+                state.double_array_value.data[:] = value
+            else:
+                setattr(state, field, value)
+        if trigger is not None:
+            state = rerun.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fm = ForwardMsg()
+            fm.ParseFromString(await self.ws.recv())
+            kind = fm.WhichOneof("type")
+            if kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                element = fm.delta.new_element
+                inner = getattr(element, element.WhichOneof("type"))
+                if getattr(inner, "id", "") and hasattr(inner, "label"):
+                    self.widgets[inner.label] = (element.WhichOneof("type"), inner.id, fm.delta.fragment_id)
+                    if element.WhichOneof("type") == "radio":
+                        self.radio_options = list(inner.options)
+            elif kind == "script_finished" and fm.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - start
+
+    async def run(self, action: str, option=None):
+        """
+        Applies one action and returns the rerun time in seconds.
+        """
+        if action == "open":
+            return await self._rerun()
+        if action == "start":
+            self.states[self._widget("Random seed")[1]] = ("int_value", self.seed)
+            self.states[self._widget("Number of questions")[1]] = ("double_array_value", [self.questions])
+            return await self._rerun(self._widget("Start")[1])
+        if action == "select":
+            _, wid, fragment_id = self._widget("Select one answer")
+            # Radios are keyed per question; drop the ones already left behind.
+            self.states = {k: v for k, v in self.states.items() if v[0] != "string_value"}
+            self.states[wid] = ("string_value", self.radio_options[option])
+            return await self._rerun(fragment_id=fragment_id)
+        label = {"confirm": "Confirm", "skip": "Skip", "previous": "Previous"}.get(action, "Next")
+        _, wid, fragment_id = self._widget(label)
+        return await self._rerun(wid, fragment_id)
+
+
+async def _server_candidates(port: int, sessions: int, questions: int, think: float, seed: int, server_pid: int):
+    latencies = {}
+    candidates = [ServerSession(port, seed + n, questions) for n in range(sessions)]
+    for session in candidates:
+        await session.connect()
+
+    async def candidate(n: int):
+        rng = random.Random(seed * 1_000_003 + n)
+        session = candidates[n]
+        await session.run("open")
+        await asyncio.sleep(rng.uniform(0, think))  # staggered arrivals
+        for action, option in scenario(rng, questions):
+            latencies.setdefault(action, []).append(await session.run(action, option))
+            await asyncio.sleep(think_time(rng, think))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(candidate(n) for n in range(sessions)))
+    wall = time.perf_counter() - start
+    # Measured while every session is still connected and holding its state.
+    after = rss(server_pid)
+    for session in candidates:
+        await session.close()
+    return latencies, wall, after
+
+
+def run_server(sessions: int, questions: int, think: float, seed: int):
+    """
+    Drives `sessions` websocket candidates against a fresh local server and
+    returns (latencies by action, wall seconds, server RSS growth or None).
+    """
+    port = _free_port()
+    proc = launch_server(port)
+    try:
+        before = rss(proc.pid)
+        latencies, wall, after = asyncio.run(_server_candidates(port, sessions, questions, think, seed, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait()
+    return latencies, wall, None if before is None or after is None else after - before
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def percentiles(values):
+    """
+    Returns (p50, p95, p99) of a list of at least one value.
+    """
+    if len(values) < 2:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def summarize(sessions: int, latencies, wall: float, rss_growth):
+    every = [t for runs in latencies.values() for t in runs]
+    p50, p95, p99 = percentiles(every)
+    return {
+        "sessions": sessions,
+        "reruns": len(every),
+        "p50_ms": p50 * 1e3,
+        "p95_ms": p95 * 1e3,
+        "p99_ms": p99 * 1e3,
+        "reruns_per_s": len(every) / wall,
+        "rss_per_session_mib": None if rss_growth is None else rss_growth / sessions / 2**20,
+        "by_action_p95_ms": {action: percentiles(runs)[1] * 1e3 for action, runs in sorted(latencies.items())},
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the quiz app.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrent candidates per step")
+    parser.add_argument("--server", action="store_true", help="drive a local `streamlit run` server instead of AppTest")
+    parser.add_argument("--questions", type=int, default=10, help="quiz length per candidate (10-200, multiple of 10)")
+    parser.add_argument("--think", type=float, default=1.0, help="median think time between actions, in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the summaries to this JSON file")
+    args = parser.parse_args()
+
+    run = run_server if args.server else run_apptest
+    print(f"{'server' if args.server else 'AppTest'} sessions, {args.questions} questions, median think {args.think}s")
+    print(f"{'sessions':>8} {'reruns':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'reruns/s':>9} {'MiB/session':>12}")
+    summaries = []
+    for n in args.sessions:
+        summary = summarize(n, *run(n, args.questions, args.think, args.seed))
+        summaries.append(summary)
+        mib = summary["rss_per_session_mib"]
+        print(
+            f"{n:>8} {summary['reruns']:>7} {summary['p50_ms']:>7.1f}ms {summary['p95_ms']:>7.1f}ms "
+            f"{summary['p99_ms']:>7.1f}ms {summary['reruns_per_s']:>9.1f} {'n/a' if mib is None else f'{mib:.2f}':>12}"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"server": args.server, "questions": args.questions,
+                                              "think": args.think, "results": summaries}, indent=2) + "\n")
+        print(f"wrote {args.out}")
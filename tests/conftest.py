@@ -0,0 +1,22 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+
+def _load_bank_module():
+    # The bank lives in a file whose name is not a valid module name.
+    module = sys.modules.get("pmpexamapp2")
+    if module is None:
+        path = Path(__file__).resolve().parent.parent / "pmpexamapp2.py.py"
+        spec = importlib.util.spec_from_file_location("pmpexamapp2", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def pmp():
+    return _load_bank_module()
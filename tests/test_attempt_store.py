@@ -0,0 +1,72 @@
+import sqlite3
+
+
+def test_bad_row_is_dropped_and_the_writer_keeps_going(pmp, tmp_path):
+    store = pmp.AttemptStore(tmp_path / "attempts.db")
+    question = pmp.get_question(seed=7, index=0)
+    store.record("ana", 7, question, 1, True)
+    store.record("ana", 7, question, None, False)  # violates NOT NULL
+    store.record("ana", 7, question, 2, False)
+    store.flush()
+    store.record("ana", 7, question, 3, False)
+    store.flush()
+    assert [a["selected"] for a in store.attempts("ana")] == [3, 2, 1]
+    assert (store.written, store.failed) == (3, 1)
+    assert store.learner_summary("ana")["answered"] == 3
+    store.close()
+
+
+def test_attempts_survive_reopening(pmp, tmp_path):
+    path = tmp_path / "attempts.db"
+    store = pmp.AttemptStore(path)
+    for index in range(5):
+        question = pmp.get_question(seed=3, index=index)
+        store.record("ben", 3, question, 0, question.answer_index == 0, seconds=1.5)
+    store.close()
+    reopened = pmp.AttemptStore(path)
+    assert len(reopened.attempts("ben")) == 5
+    assert reopened.popular_seeds(1) == [3]
+    reopened.close()
+
+
+def test_question_key_identifies_content_across_banks(pmp, tmp_path):
+    small = pmp.generate_compact_bank(total=50, seed=7)
+    large = pmp.generate_compact_bank(total=200, seed=7)
+    pmp.save_bank(large, str(tmp_path / "bank.pmpbank"))
+    mapped = pmp.load_bank(str(tmp_path / "bank.pmpbank"))
+    by_key = {}
+    for q in list(small) + list(large) + list(mapped):
+        assert by_key.setdefault(q.key, (q.topic, q.question)) == (q.topic, q.question)
+    assert [q.key for q in mapped] == [q.key for q in large]
+    mapped.close()
+
+    store = pmp.AttemptStore(tmp_path / "attempts.db")
+    store.record("ana", 7, small[0], 0, False)
+    store.flush()
+    assert store.attempts("ana")[0]["question_key"] == small[0].key
+    store.close()
+
+
+def test_version_1_database_gains_question_keys(pmp, tmp_path):
+    path = tmp_path / "attempts.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(
+            """
+            CREATE TABLE attempts (
+                id INTEGER PRIMARY KEY, user TEXT NOT NULL, mode TEXT NOT NULL, seed INTEGER NOT NULL,
+                question_id TEXT NOT NULL, domain TEXT NOT NULL, topic TEXT NOT NULL, selected INTEGER NOT NULL,
+                correct INTEGER NOT NULL, skipped INTEGER NOT NULL, seconds REAL, answered_at REAL NOT NULL
+            );
+            CREATE INDEX attempts_question ON attempts (question_id);
+            PRAGMA user_version = 1;
+            """
+            + pmp._ROLLUP_SCHEMA
+        )
+    store = pmp.AttemptStore(path)
+    question = pmp.get_question(seed=7, index=0)
+    store.record("ben", 7, question, 1, True)
+    store.flush()
+    assert store.attempts("ben")[0]["question_key"] == question.key
+    indexes = {row[1] for row in store._reader().execute("PRAGMA index_list(attempts)")}
+    assert "attempts_question_key" in indexes and "attempts_question" not in indexes
+    store.close()
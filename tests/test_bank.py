@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+FILTERS = [{}, {"domains": ["People"]}, {"domains": ["Process", "Business Environment"], "topics": ["Quality", "Strategy Alignment"]}]
+
+
+def _columns(bank):
+    return [(q.domain_index, q.template_index, q.number, q.var_code) for q in bank]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_get_question_matches_iteration(pmp, filters):
+    bank = list(pmp.iter_compact_bank(total=333, seed=11, **filters))
+    assert [dict(pmp.get_question(11, i, total=333, **filters)) for i in range(333)] == [dict(q) for q in bank]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_numpy_backend_matches_python(pmp, filters):
+    pytest.importorskip("numpy")
+    python = pmp.generate_compact_bank(total=5_000, seed=3, backend="python", **filters)
+    numpy = pmp.generate_compact_bank(total=5_000, seed=3, backend="numpy", **filters)
+    assert _columns(numpy) == _columns(python)
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_sharded_bank_matches_single_process(pmp, backend):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    single = pmp.generate_compact_bank(total=10_000, seed=5, backend=backend)
+    sharded = pmp.generate_compact_bank(total=10_000, seed=5, backend=backend, workers=2, shard_size=3_000)
+    assert _columns(sharded) == _columns(single)
+
+
+def test_save_and_load_bank_round_trip(pmp, tmp_path):
+    bank = pmp.generate_compact_bank(total=500, seed=9)
+    path = tmp_path / "bank.pmpbank"
+    pmp.save_bank(bank, str(path))
+    loaded = pmp.load_bank(str(path))
+    try:
+        assert len(loaded) == len(bank)
+        assert [dict(q) for q in loaded] == [dict(q) for q in bank]
+    finally:
+        loaded.close()
+
+
+def test_quiz_state_aggregates_match_grade_batch(pmp):
+    bank = pmp.generate_compact_bank(total=200, seed=7)
+    order = random.Random(1).sample(range(len(bank)), 60)
+    quiz = pmp.QuizState(bank, order)
+    rng = random.Random(2)
+    for i in range(len(quiz)):
+        roll = rng.random()
+        if roll < 0.1:
+            quiz.skip(i)
+        elif roll < 0.9:
+            quiz.answer(i, rng.randrange(len(quiz.question(i).options)))
+
+    report = pmp.grade_batch(bank, order, quiz.selections())
+    assert (quiz.score, quiz.answered_count) == (report.score, report.answered)
+    assert quiz.by_domain == report.by_domain
+    assert quiz.by_topic == report.by_topic
+    assert quiz.incorrect() == report.wrong
+
+
+def test_topic_coverage_varies_with_the_seed(pmp):
+    everything = {(q.domain, q.topic) for q in pmp.generate_compact_bank(total=200, seed=7)}
+    generated, sampled = set(), set()
+    pool = pmp.generate_compact_bank(total=20_000, seed=3)
+    strata = pmp.BankStrata(pool)
+    for seed in range(1, 60):
+        covered = {(q.domain, q.topic) for q in pmp.iter_compact_bank(total=10, seed=seed)}
+        assert len(covered) == 10  # one question per topic while topics outnumber the quota
+        generated |= covered
+        sampled |= {(pool[p].domain, pool[p].topic) for p in strata.sample(10, seed=seed)}
+    assert generated == everything
+    assert sampled == everything
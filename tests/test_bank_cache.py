@@ -0,0 +1,25 @@
+def test_get_returns_the_shared_bank(pmp):
+    cache = pmp.BankCache(maxsize=2)
+    bank = cache.get(total=50, seed=3)
+    assert cache.get(total=50, seed=3) is bank
+    assert [q.id for q in bank] == [q.id for q in pmp.iter_compact_bank(total=50, seed=3)]
+    assert cache.stats()["hits"] == 1
+
+
+def test_prefetch_with_same_tag_and_settings_keeps_the_build(pmp):
+    cache = pmp.BankCache()
+    first = cache.prefetch(total=50_000, seed=3, tag="session")
+    assert first is not None
+    assert cache.prefetch(total=50_000, seed=3, tag="session") is None
+    assert first.result(timeout=60) is not None
+    assert cache.stats()["cancelled"] == 0
+    assert cache.stats()["size"] == 1
+
+
+def test_prefetch_with_new_settings_cancels_the_old_one(pmp):
+    cache = pmp.BankCache(workers=1)
+    cache.prefetch(total=400_000, seed=1, tag="session")
+    latest = cache.prefetch(total=50, seed=2, tag="session")
+    assert latest.result(timeout=60) is not None
+    assert cache.get(total=50, seed=2) is latest.result()
+    assert cache.stats()["cancelled"] == 1
@@ -0,0 +1,12 @@
+import itertools
+
+
+def test_overlap_counts_questions_not_pool_positions(pmp):
+    pool = pmp.generate_compact_bank(total=5_000, seed=7)
+    result = pmp.assemble_forms(pool, 4, 60, seed=3, candidates=1)
+
+    texts = [[(pool[p].topic, pool[p].question) for p in form] for form in result.forms]
+    assert all(len(set(form)) == len(form) == 60 for form in texts)
+    pairs = [len(set(a) & set(b)) for a, b in itertools.combinations(texts, 2)]
+    assert result.report.max_overlap == max(pairs)
+    assert result.report.distinct == len(set().union(*map(set, texts)))
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+
+def _row(qid, **fields):
+    row = {
+        "id": qid,
+        "domain": "People",
+        "topic": "Conflict",
+        "question": f"Question {qid}?",
+        "options": ["A", "B", "C", "D"],
+        "answer_index": 1,
+        "explanation": "Because.",
+    }
+    row.update(fields)
+    return row
+
+
+def test_invalid_utf8_rows_are_reported_not_fatal(pmp, tmp_path):
+    path = tmp_path / "bank.jsonl"
+    lines = [json.dumps(_row(f"q{i}")).encode() for i in range(3)]
+    lines[1] = lines[1].replace(b"Question", b"Qu\xe9stion")
+    path.write_bytes(b"\n".join(lines) + b"\n")
+
+    bank = pmp.import_bank(path, cache_dir=tmp_path / "cache")
+    assert bank.ids == ["q0", "q2"]
+    assert bank.errors == [pmp.RowError(2, "not valid UTF-8")]
+
+
+def test_invalid_utf8_csv_rows_are_reported_not_fatal(pmp, tmp_path):
+    path = tmp_path / "bank.csv"
+    header = "id,domain,topic,question,options,answer_index,explanation\n"
+    rows = [f"q{i},People,Conflict,Question {i}?,A|B|C|D,1,Because.\n".encode() for i in range(3)]
+    rows[1] = rows[1].replace(b"Question", b"Qu\xe9stion")
+    path.write_bytes(header.encode() + b"".join(rows))
+
+    bank = pmp.import_bank(path, cache_dir=tmp_path / "cache")
+    assert bank.ids == ["q0", "q2"]
+    assert bank.errors == [pmp.RowError(3, "not valid UTF-8")]
+
+
+def test_oversized_files_are_rejected_before_parsing(pmp, tmp_path, monkeypatch):
+    monkeypatch.setattr(pmp, "_IMPORT_LIMIT", 2)
+    path = tmp_path / "bank.jsonl"
+    path.write_text("".join(json.dumps(_row(f"q{i}")) + "\n" for i in range(3)))
+
+    with pytest.raises(ValueError, match="at most 2 questions"):
+        pmp.import_bank(path, cache_dir=tmp_path / "cache")
+    assert not (tmp_path / "cache").exists()
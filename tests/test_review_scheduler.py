@@ -0,0 +1,32 @@
+from collections import Counter
+
+
+def test_missed_topic_comes_back_sooner(pmp):
+    bank = pmp.generate_compact_bank(total=200, seed=7)
+    scheduler = pmp.ReviewScheduler(bank, seed=1)
+    weak = scheduler.question(scheduler.next(now=0.0)).topic
+    asked = Counter()
+    for step in range(300):
+        now = step * 5.0
+        i = scheduler.next(now=now)
+        topic = scheduler.question(i).topic
+        asked[topic] += 1
+        scheduler.review(i, topic != weak, now=now)
+    assert asked.most_common(1)[0][0] == weak
+    assert min(scheduler.topic_ease(), key=scheduler.topic_ease().get) == weak
+
+
+def test_stale_heap_entries_are_skipped(pmp):
+    bank = pmp.generate_compact_bank(total=200, seed=7)
+    positions = [p for p, q in enumerate(bank) if q.topic == "Conflict Management"]
+    scheduler = pmp.ReviewScheduler(bank, positions, seed=1)
+    i = scheduler.next(now=0.0)
+    scheduler.review(i, False, now=0.0)  # due in a minute...
+    scheduler.review(i, True, now=0.0)  # ...then rescheduled ten minutes out
+    assert scheduler.due(i) == 600.0
+    assert scheduler.next(now=100.0) != i  # the one-minute entry is stale
+    while scheduler.new_count:
+        j = scheduler.next(now=100.0)
+        assert j != i
+        scheduler.review(j, True, now=100.0)
+    assert scheduler.next(now=700.0) == i
@@ -0,0 +1,72 @@
+import pytest
+
+
+def test_distinct_search_lists_each_question_once(pmp):
+    bank = pmp.generate_compact_bank(total=200, seed=7)
+    index = pmp.SearchIndex(bank)
+    every = index.search("supplier OR sponsor", limit=len(bank))
+    distinct = index.search("supplier OR sponsor", limit=len(bank), distinct=True)
+
+    keys = [bank[hit.position].key for hit in distinct.hits]
+    assert len(set(keys)) == len(keys) == distinct.total
+    assert set(keys) == {bank[hit.position].key for hit in every.hits}
+    assert sum(hit.copies for hit in distinct.hits) == every.total
+
+
+def test_distinct_bank_holds_every_question_once(pmp):
+    bank = pmp.distinct_bank(domains=["People"])
+    assert len(bank) == pmp.unique_capacity(domains=["People"])["People"]
+    assert len({q.key for q in bank}) == len({(q.topic, q.question) for q in bank}) == len(bank)
+    seeded = {q.key for q in pmp.generate_compact_bank(total=500, seed=3, domains=["People"])}
+    assert seeded <= {q.key for q in bank}
+
+
+QUERIES = [
+    "sponsor",
+    "escalat*",
+    "conflict OR supplier",
+    "agile healthcare",
+    "Aisha | Miguel telecom",
+    "risk* register* OR chang* control",
+    "nonexistentword",
+]
+
+
+def _brute_force(pmp, bank, query, domains=None):
+    # Renders every question and checks the query against its tokens.
+    groups, terms = [], []
+    for word in query.split():
+        if word in ("OR", "|"):
+            if terms:
+                groups.append(terms)
+            terms = []
+            continue
+        tokens = pmp._TOKEN_RE.findall(word.lower())
+        prefix = word.endswith("*") and bool(tokens)
+        terms += [(token, False) for token in (tokens[:-1] if prefix else tokens) if token not in pmp._STOPWORDS]
+        if prefix:
+            terms.append((tokens[-1], True))
+    if terms:
+        groups.append(terms)
+
+    matches = set()
+    for position, q in enumerate(bank):
+        if domains is not None and q.domain not in domains:
+            continue
+        words = set(pmp._tokens(" ".join([q.question, *q.options, q.explanation])))
+        for group in groups:
+            if all(any(w.startswith(t) for w in words) if prefix else t in words for t, prefix in group):
+                matches.add(position)
+                break
+    return matches
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_a_scan_of_rendered_text(pmp, query):
+    bank = pmp.generate_compact_bank(total=3_000, seed=11)
+    index = pmp.SearchIndex(bank)
+    for domains in (None, ["People", "Business Environment"]):
+        result = index.search(query, domains=domains, limit=len(bank))
+        expected = _brute_force(pmp, bank, query, domains)
+        assert result.total == len(expected)
+        assert {hit.position for hit in result.hits} == expected
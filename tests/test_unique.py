@@ -0,0 +1,35 @@
+import pytest
+
+FILTERS = [
+    {},
+    {"domains": ["Process"]},
+    {"topics": ["Integration / Change control", "Agile/Hybrid Value Delivery"]},
+    {"topics": ["Agile/Hybrid Value Delivery", "Conflict Management", "Governance / Policy"]},
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_unique_bank_texts_are_distinct(pmp, filters):
+    total = min(pmp.max_unique_total(**filters), 3_000)
+    bank = pmp.generate_compact_bank(total=total, seed=5, unique=True, **filters)
+    texts = [q.question for q in bank]
+    assert len(texts) == total
+    assert len(set(texts)) == total
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_unique_get_question_matches_iteration(pmp, filters):
+    total = min(pmp.max_unique_total(**filters), 500)
+    bank = [dict(q) for q in pmp.iter_compact_bank(total=total, seed=9, unique=True, **filters)]
+    assert [dict(pmp.get_question(9, i, total=total, unique=True, **filters)) for i in range(total)] == bank
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_totals_above_max_unique_total_raise(pmp, filters):
+    total = pmp.max_unique_total(**filters) + 1
+    with pytest.raises(ValueError, match="unique bank"):
+        pmp.iter_compact_bank(total=total, seed=1, unique=True, **filters)
+    with pytest.raises(ValueError, match="unique bank"):
+        pmp.generate_compact_bank(total=total, seed=1, unique=True, **filters)
+    with pytest.raises(ValueError, match="unique bank"):
+        pmp.get_question(1, 0, total=total, unique=True, **filters)